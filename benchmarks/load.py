@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import gc
+import itertools
+import statistics
+import tempfile
+import time
+import tracemalloc
+import uuid
+from contextlib import asynccontextmanager
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from config import get_settings
+from database import ReplicaSet, get_replica_set, get_session_maker, migrate
+from main import app
+from users.models import Base
+
+
+API_PREFIX = "/api/v1"
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def request(
+        self, client: AsyncClient, label: str, method: str, url: str, **kwargs
+    ):
+        start = time.perf_counter()
+        response = await client.request(method, API_PREFIX + url, **kwargs)
+        self.latencies.setdefault(label, []).append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[label] = self.errors.get(label, 0) + 1
+        return response
+
+
+class VirtualUser:
+    def __init__(self, login: str, password: str):
+        self.login = login
+        self.password = password
+        self.access_token = ""
+        self.refresh_token = ""
+        self.project_id = 0
+        self.script_paths = itertools.count()
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+    async def setup(self, client: AsyncClient) -> None:
+        credentials = {"login": self.login, "password": self.password}
+        response = await client.post(f"{API_PREFIX}/register", json=credentials)
+        response.raise_for_status()
+        response = await client.post(f"{API_PREFIX}/token", json=credentials)
+        response.raise_for_status()
+        self.access_token = response.json()["access_token"]
+        self.refresh_token = response.json()["refresh_token"]
+        response = await client.post(
+            f"{API_PREFIX}/projects/", json={"name": self.login}, headers=self.headers
+        )
+        response.raise_for_status()
+        self.project_id = response.json()["id"]
+
+
+async def login(client: AsyncClient, user: VirtualUser, recorder: Recorder) -> None:
+    await recorder.request(
+        client,
+        "POST /token",
+        "POST",
+        "/token",
+        json={"login": user.login, "password": user.password},
+    )
+
+
+async def refresh(client: AsyncClient, user: VirtualUser, recorder: Recorder) -> None:
+    response = await recorder.request(
+        client,
+        "POST /token/refresh",
+        "POST",
+        "/token/refresh",
+        json={"refresh_token": user.refresh_token},
+    )
+    if response.status_code == 200:
+        user.refresh_token = response.json()["refresh_token"]
+
+
+async def me(client: AsyncClient, user: VirtualUser, recorder: Recorder) -> None:
+    await recorder.request(
+        client, "GET /users/me", "GET", "/users/me", headers=user.headers
+    )
+
+
+async def projects(client: AsyncClient, user: VirtualUser, recorder: Recorder) -> None:
+    await recorder.request(
+        client, "GET /projects/", "GET", "/projects/", headers=user.headers
+    )
+
+
+async def scripts(client: AsyncClient, user: VirtualUser, recorder: Recorder) -> None:
+    base = f"/projects/{user.project_id}/scripts"
+    path = f"bench/{next(user.script_paths)}.py"
+    response = await recorder.request(
+        client,
+        "POST /projects/{id}/scripts",
+        "POST",
+        base,
+        json={"path": path, "source_code": "print('bench')\n" * 64},
+        headers=user.headers,
+    )
+    if response.status_code != 200:
+        return
+    script_url = f"{base}/{response.json()['id']}"
+    await recorder.request(
+        client,
+        "GET /projects/{id}/scripts/{id}",
+        "GET",
+        script_url,
+        headers=user.headers,
+    )
+    await recorder.request(
+        client,
+        "PUT /projects/{id}/scripts/{id}",
+        "PUT",
+        script_url,
+        json={"path": path, "source_code": "print('updated')\n" * 64},
+        headers=user.headers,
+    )
+    await recorder.request(
+        client,
+        "DELETE /projects/{id}/scripts/{id}",
+        "DELETE",
+        script_url,
+        headers=user.headers,
+    )
+
+
+SCENARIOS = {
+    "login": login,
+    "refresh": refresh,
+    "me": me,
+    "projects": projects,
+    "scripts": scripts,
+}
+
+
+def configure_sqlite(dbapi_connection, _connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+
+@asynccontextmanager
+async def in_process_client(database_url: str | None):
+    with tempfile.TemporaryDirectory() as directory:
+        async with in_process_app_client(
+            database_url or f"sqlite+aiosqlite:///{directory}/bench.sqlite3"
+        ) as client:
+            yield client
+
+
+@asynccontextmanager
+async def in_process_app_client(database_url: str):
+    engine = create_async_engine(database_url)
+    if engine.dialect.name == "sqlite":
+        # WAL lets concurrent virtual users read while another one commits.
+        event.listen(engine.sync_engine, "connect", configure_sqlite)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    else:
+        await migrate(engine)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    app.dependency_overrides[get_session_maker] = lambda: session_maker
+    app.dependency_overrides[get_replica_set] = lambda: ReplicaSet([])
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=app, raise_app_exceptions=False),
+            base_url="http://bench",
+        ) as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+        await engine.dispose()
+
+
+def percentile(latencies: list[float], percent: int) -> float:
+    if len(latencies) < 2:
+        return latencies[0]
+    return statistics.quantiles(latencies, n=100, method="inclusive")[percent - 1]
+
+
+def report(recorder: Recorder, elapsed: float) -> None:
+    print(
+        f"{'endpoint':<36} {'count':>7} {'errors':>6} {'rps':>9} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for label, latencies in recorder.latencies.items():
+        print(
+            f"{label:<36} {len(latencies):>7} {recorder.errors.get(label, 0):>6} "
+            f"{len(latencies) / elapsed:>9.1f} "
+            f"{percentile(latencies, 50) * 1000:>8.2f} "
+            f"{percentile(latencies, 95) * 1000:>8.2f} "
+            f"{percentile(latencies, 99) * 1000:>8.2f}"
+        )
+    total = sum(len(latencies) for latencies in recorder.latencies.values())
+    print(f"total: {total} requests in {elapsed:.2f}s, {total / elapsed:.1f} req/s")
+
+
+async def run(args: argparse.Namespace) -> None:
+    if args.base_url:
+        client_context = AsyncClient(base_url=args.base_url, timeout=30)
+    else:
+        # Every virtual user shares one client IP, so the login/register limits
+        # would turn the auth scenarios into 429s.
+        get_settings().rate_limit.rate_limit_enabled = args.rate_limit
+        client_context = in_process_client(args.database_url)
+
+    async with client_context as client:
+        run_id = uuid.uuid4().hex[:8]
+        users = [
+            VirtualUser(f"bench-{run_id}-{index}", "bench-password")
+            for index in range(args.concurrency)
+        ]
+        await asyncio.gather(*(user.setup(client) for user in users))
+
+        scenarios = [SCENARIOS[name] for name in args.scenarios]
+        recorder = Recorder()
+
+        async def virtual_user_loop(user: VirtualUser) -> None:
+            for _ in range(args.iterations):
+                for scenario in scenarios:
+                    await scenario(client, user, recorder)
+
+        gc.collect()
+        collections_before = sum(stats["collections"] for stats in gc.get_stats())
+        if args.trace_allocations:
+            tracemalloc.start()
+        start = time.perf_counter()
+        await asyncio.gather(*(virtual_user_loop(user) for user in users))
+        elapsed = time.perf_counter() - start
+        if args.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        collections = (
+            sum(stats["collections"] for stats in gc.get_stats()) - collections_before
+        )
+
+    report(recorder, elapsed)
+    print(f"gc collections: {collections}")
+    if args.trace_allocations:
+        print(
+            f"allocations: peak {peak / 1024:.0f} KiB, "
+            f"retained {current / 1024:.0f} KiB"
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Drive the auth and CRUD hot paths and report latency percentiles"
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument(
+        "--database-url",
+        help="database for the in-process ASGI app, migrated on start "
+        "(default: a temporary SQLite file)",
+    )
+    target.add_argument(
+        "--base-url",
+        help="benchmark an already running server instead, e.g. http://localhost:8000",
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument(
+        "--rate-limit",
+        action="store_true",
+        help="keep login and registration rate limits on for in-process runs",
+    )
+    parser.add_argument(
+        "--trace-allocations",
+        action="store_true",
+        help="track allocations with tracemalloc (slows every request down)",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
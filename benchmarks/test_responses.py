@@ -0,0 +1,38 @@
+from decimal import Decimal
+from typing import List
+
+from responses import schema_response
+from scripts.models import ProjectModel, ScriptModel
+from scripts.schemas import ProjectInfoSchema, ScriptMetaSchema
+from users.models import UserModel
+from users.schemas import UserInfoResponseSchema
+
+
+def test_serialize_user(benchmark):
+    user = UserModel(
+        id=1, login="benchmark", password="hash", money_balance=Decimal("100.5")
+    )
+    benchmark(schema_response, UserInfoResponseSchema, user)
+
+
+def test_serialize_project_page(benchmark):
+    projects = [
+        ProjectModel(id=index, name=f"project-{index}", owner_id=1, version=1)
+        for index in range(100)
+    ]
+    benchmark(schema_response, List[ProjectInfoSchema], projects)
+
+
+def test_serialize_script_page(benchmark):
+    scripts = [
+        ScriptModel(
+            id=index,
+            path=f"src/module_{index}.py",
+            blob_hash="0" * 64,
+            size=1024,
+            parent_project_id=1,
+            version=1,
+        )
+        for index in range(100)
+    ]
+    benchmark(schema_response, List[ScriptMetaSchema], scripts)
@@ -0,0 +1,44 @@
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+from config import get_settings
+from users.dependencies import validate_token_payload
+from users.keys import KeyRing, SigningKey, get_key_ring
+from users.utils import create_access_token, decode_jwt, encode_jwt
+
+
+PAYLOAD = {"id": 1, "token_version": 0, "token_type": "access"}
+
+
+def make_signing_key(algorithm: str) -> SigningKey:
+    if algorithm == "HS256":
+        secret = get_settings().auth_jwt.secret_key
+        return SigningKey(None, algorithm, secret, secret)
+    private_key = {
+        "RS256": lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+        "ES256": lambda: ec.generate_private_key(ec.SECP256R1()),
+        "EdDSA": ed25519.Ed25519PrivateKey.generate,
+    }[algorithm]()
+    return SigningKey(algorithm, algorithm, private_key, private_key.public_key())
+
+
+@pytest.fixture(params=["HS256", "RS256", "ES256", "EdDSA"])
+def signing_key(request):
+    return make_signing_key(request.param)
+
+
+def test_encode_jwt(benchmark, signing_key):
+    benchmark(encode_jwt, PAYLOAD, signing_key, 5)
+
+
+def test_decode_jwt(benchmark, signing_key):
+    token = encode_jwt(PAYLOAD, signing_key, 5)
+    key_ring = KeyRing([signing_key])
+    assert benchmark(decode_jwt, token, key_ring)["id"] == 1
+
+
+def test_validate_token_payload(benchmark):
+    settings = get_settings()
+    get_key_ring.cache_clear()
+    token = create_access_token(1, 0, settings)
+    assert benchmark(validate_token_payload, token, settings).id == 1
@@ -0,0 +1,36 @@
+"""indexes for ownership lookups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_projects_owner_id_id",
+        "projects",
+        ["owner_id", "id"],
+        postgresql_include=["name"],
+    )
+    op.create_index(
+        "ix_scripts_parent_project_id_id",
+        "scripts",
+        ["parent_project_id", "id"],
+        postgresql_include=["path"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_scripts_parent_project_id_id", table_name="scripts")
+    op.drop_index("ix_projects_owner_id_id", table_name="projects")
@@ -0,0 +1,98 @@
+"""store script source in chunks
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SOURCE_CHUNK_SIZE = 64 * 1024
+
+scripts = sa.table(
+    "scripts",
+    sa.column("id", sa.Integer),
+    sa.column("source_code", sa.String),
+    sa.column("size", sa.Integer),
+)
+script_chunks = sa.table(
+    "script_chunks",
+    sa.column("script_id", sa.Integer),
+    sa.column("seq", sa.Integer),
+    sa.column("data", sa.LargeBinary),
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "script_chunks",
+        sa.Column("script_id", sa.Integer(), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(["script_id"], ["scripts.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("script_id", "seq"),
+    )
+    op.add_column(
+        "scripts",
+        sa.Column("size", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(scripts.c.id, scripts.c.source_code))
+    for script_id, source_code in rows.fetchall():
+        data = source_code.encode("utf-8")
+        chunks = [
+            {
+                "script_id": script_id,
+                "seq": seq,
+                "data": data[offset : offset + SOURCE_CHUNK_SIZE],
+            }
+            for seq, offset in enumerate(range(0, len(data), SOURCE_CHUNK_SIZE))
+        ]
+        if chunks:
+            connection.execute(script_chunks.insert(), chunks)
+        connection.execute(
+            scripts.update().where(scripts.c.id == script_id).values(size=len(data))
+        )
+
+    with op.batch_alter_table("scripts") as batch_op:
+        batch_op.alter_column("size", server_default=None)
+        batch_op.drop_column("source_code")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "scripts",
+        sa.Column("source_code", sa.String(), nullable=False, server_default=""),
+    )
+
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(script_chunks.c.script_id, script_chunks.c.data).order_by(
+            script_chunks.c.script_id, script_chunks.c.seq
+        )
+    )
+    sources: dict[int, bytearray] = {}
+    for script_id, data in rows:
+        sources.setdefault(script_id, bytearray()).extend(data)
+    for script_id, data in sources.items():
+        connection.execute(
+            scripts.update()
+            .where(scripts.c.id == script_id)
+            .values(source_code=data.decode("utf-8"))
+        )
+
+    with op.batch_alter_table("scripts") as batch_op:
+        batch_op.alter_column("source_code", server_default=None)
+        batch_op.drop_column("size")
+    op.drop_table("script_chunks")
@@ -0,0 +1,142 @@
+"""content-addressed script blobs
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+
+"""
+
+import hashlib
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+scripts = sa.table(
+    "scripts",
+    sa.column("id", sa.Integer),
+    sa.column("blob_hash", sa.String),
+)
+script_chunks = sa.table(
+    "script_chunks",
+    sa.column("script_id", sa.Integer),
+    sa.column("seq", sa.Integer),
+    sa.column("data", sa.LargeBinary),
+)
+blobs = sa.table(
+    "blobs",
+    sa.column("hash", sa.String),
+    sa.column("size", sa.Integer),
+    sa.column("ref_count", sa.Integer),
+)
+blob_chunks = sa.table(
+    "blob_chunks",
+    sa.column("blob_hash", sa.String),
+    sa.column("seq", sa.Integer),
+    sa.column("data", sa.LargeBinary),
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "blobs",
+        sa.Column("hash", sa.String(length=64), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("hash"),
+    )
+    op.create_table(
+        "blob_chunks",
+        sa.Column("blob_hash", sa.String(length=64), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(["blob_hash"], ["blobs.hash"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("blob_hash", "seq"),
+    )
+    op.add_column("scripts", sa.Column("blob_hash", sa.String(length=64)))
+
+    connection = op.get_bind()
+    ref_counts: dict[str, int] = {}
+    script_ids = connection.execute(sa.select(scripts.c.id)).scalars().all()
+    for script_id in script_ids:
+        chunks = (
+            connection.execute(
+                sa.select(script_chunks.c.data)
+                .where(script_chunks.c.script_id == script_id)
+                .order_by(script_chunks.c.seq)
+            )
+            .scalars()
+            .all()
+        )
+        digest = hashlib.sha256()
+        for chunk in chunks:
+            digest.update(chunk)
+        blob_hash = digest.hexdigest()
+
+        if blob_hash not in ref_counts:
+            ref_counts[blob_hash] = 0
+            connection.execute(
+                blobs.insert().values(
+                    hash=blob_hash, size=sum(map(len, chunks)), ref_count=0
+                )
+            )
+            if chunks:
+                connection.execute(
+                    blob_chunks.insert(),
+                    [
+                        {"blob_hash": blob_hash, "seq": seq, "data": chunk}
+                        for seq, chunk in enumerate(chunks)
+                    ],
+                )
+        ref_counts[blob_hash] += 1
+        connection.execute(
+            scripts.update()
+            .where(scripts.c.id == script_id)
+            .values(blob_hash=blob_hash)
+        )
+
+    for blob_hash, ref_count in ref_counts.items():
+        connection.execute(
+            blobs.update().where(blobs.c.hash == blob_hash).values(ref_count=ref_count)
+        )
+
+    with op.batch_alter_table("scripts") as batch_op:
+        batch_op.alter_column(
+            "blob_hash", existing_type=sa.String(length=64), nullable=False
+        )
+        batch_op.create_foreign_key(
+            "fk_scripts_blob_hash_blobs", "blobs", ["blob_hash"], ["hash"]
+        )
+        batch_op.create_index("ix_scripts_blob_hash", ["blob_hash"])
+    op.drop_table("script_chunks")
+
+
+def downgrade() -> None:
+    op.create_table(
+        "script_chunks",
+        sa.Column("script_id", sa.Integer(), nullable=False),
+        sa.Column("seq", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(["script_id"], ["scripts.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("script_id", "seq"),
+    )
+    op.execute(
+        script_chunks.insert().from_select(
+            ["script_id", "seq", "data"],
+            sa.select(scripts.c.id, blob_chunks.c.seq, blob_chunks.c.data).join(
+                blob_chunks, blob_chunks.c.blob_hash == scripts.c.blob_hash
+            ),
+        )
+    )
+    with op.batch_alter_table("scripts") as batch_op:
+        batch_op.drop_index("ix_scripts_blob_hash")
+        batch_op.drop_constraint("fk_scripts_blob_hash_blobs", type_="foreignkey")
+        batch_op.drop_column("blob_hash")
+    op.drop_table("blob_chunks")
+    op.drop_table("blobs")
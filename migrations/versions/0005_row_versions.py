@@ -0,0 +1,34 @@
+"""row versions for projects and scripts
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for table_name in ("projects", "scripts"):
+        op.add_column(
+            table_name,
+            sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+        )
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column("version", server_default=None)
+
+
+def downgrade() -> None:
+    for table_name in ("scripts", "projects"):
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_column("version")
@@ -0,0 +1,74 @@
+"""append-only transactions ledger
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+users = sa.table(
+    "users",
+    sa.column("id", sa.Integer),
+    sa.column("money_balance", sa.Numeric(30, 10)),
+)
+transactions = sa.table(
+    "transactions",
+    sa.column("user_id", sa.Integer),
+    sa.column("kind", sa.String),
+    sa.column("amount", sa.Numeric(30, 10)),
+    sa.column("balance_after", sa.Numeric(30, 10)),
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "transactions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("amount", sa.Numeric(precision=30, scale=10), nullable=False),
+        sa.Column("balance_after", sa.Numeric(precision=30, scale=10), nullable=False),
+        sa.Column("idempotency_key", sa.String(length=255), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "user_id", "idempotency_key", name="uq_transactions_user_idempotency_key"
+        ),
+    )
+    op.create_index(
+        "ix_transactions_user_id_id", "transactions", ["user_id", "id"], unique=False
+    )
+    # Existing balances become opening entries so the ledger sums to them.
+    op.execute(
+        transactions.insert().from_select(
+            ["user_id", "kind", "amount", "balance_after"],
+            sa.select(
+                users.c.id,
+                sa.literal("opening"),
+                users.c.money_balance,
+                users.c.money_balance,
+            ).where(users.c.money_balance != 0),
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transactions_user_id_id", table_name="transactions")
+    op.drop_table("transactions")
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -11,6 +12,31 @@ class DbSettings(BaseSettings):
     db_host: str = Field("localhost", env="DB_HOST")
     db_port: int = Field(5432, env="DB_PORT")
 
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100
+    db_migrate_on_startup: bool = True
+    # DataLoader batches (user and project-owner lookups) run on their own
+    # pooled connections, next to the request sessions; at most this many at
+    # once per engine. The pool needs this much headroom above the concurrent
+    # requests, or requests holding connections starve the batches they wait on.
+    db_dataloader_connections: int = 2
+    # Read-only routes are balanced across healthy replicas; after a commit the
+    # client is pinned to the primary for db_read_your_writes_seconds.
+    db_replica_urls: list[str] = []
+    db_replica_health_check_interval: float = 5
+    db_replica_health_check_timeout: float = 1
+    db_read_your_writes_seconds: int = 5
+    # Routes declare a SQL statement budget with @query_budget; in enforce mode
+    # (the test suite) exceeding it, or repeating one statement
+    # db_n_plus_one_threshold times in a request, fails the request.
+    db_query_budget_enforce: bool = False
+    db_n_plus_one_threshold: int = 5
+    db_log_queries: bool = False
+
     @property
     def database_url(self) -> str:
         return (
@@ -23,13 +49,91 @@ class DbSettings(BaseSettings):
 class AuthJWT(BaseSettings):
     secret_key: str = Field("most secret key", env="SECRET_KEY")
     algorithm: str = "HS256"
+    # Directory of <kid>.pem private keys (RSA, Ed25519 or P-256/P-384/P-521).
+    # When set, tokens are signed with the active key and every key is
+    # published in JWKS. An unknown active_kid fails startup.
+    keys_dir: str | None = None
+    active_kid: str | None = None
+    jwks_max_age_seconds: int = 300
     access_token_expire_minutes: int = 5
     refresh_token_expire_minutes: int = 30
+    # The token cache is per process and revocations only invalidate it in the
+    # process that handled them, so with several workers it is used only when
+    # the kv backend shares token versions between them.
+    token_cache_size: int = 10000
+    token_cache_ttl_seconds: float = 30
+    token_version_backend: Literal["db", "kv"] = "db"
+
+
+class KvSettings(BaseSettings):
+    kv_url: str | None = None
+
+
+class PasswordHashing(BaseSettings):
+    bcrypt_workers: int = 4
+    bcrypt_max_pending: int = 64
+
+
+class ProjectSettings(BaseSettings):
+    ownership_cache_size: int = 10000
+    ownership_cache_ttl_seconds: float = 30
+    # Caps on decompressed archive imports, checked while reading so a zip
+    # bomb is rejected before it is expanded in memory.
+    import_max_entry_size: int = 4 * 1024 * 1024
+    import_max_total_size: int = 64 * 1024 * 1024
+
+
+class RateLimitSettings(BaseSettings):
+    # Sliding-window limits checked before any bcrypt work on /token and
+    # /register. The kv backend shares counters between workers and nodes.
+    rate_limit_enabled: bool = True
+    rate_limit_backend: Literal["memory", "kv"] = "memory"
+    rate_limit_window_seconds: int = 60
+    rate_limit_cache_size: int = 100000
+    login_ip_limit: int = 30
+    login_user_limit: int = 10
+    register_ip_limit: int = 10
+
+
+class ServiceAuth(BaseSettings):
+    service_token: str | None = None
+    ledger_batch_max_size: int = 5000
+
+
+class ServerSettings(BaseSettings):
+    host: str = "0.0.0.0"
+    port: int = Field(8000, env="PORT")
+    # Each worker is a separate process with its own event loop and its own
+    # DB pool, so the database sees up to
+    # workers * (db_pool_size + db_max_overflow) connections.
+    # In-process state is per worker too: the memory rate-limit store would
+    # let every worker grant the full limit, so workers > 1 refuses to start
+    # without rate_limit_backend="kv"; the token cache is turned off unless
+    # token_version_backend="kv"; the ownership cache only holds positive
+    # entries, and writes to a project deleted by another worker still hit
+    # the foreign key and return 404.
+    workers: int = 1
+    loop: Literal["auto", "asyncio", "uvloop"] = "auto"
+    http: Literal["auto", "h11", "httptools"] = "auto"
+    backlog: int = 2048
+    timeout_keep_alive: int = 5
+    timeout_graceful_shutdown: int | None = 30
+    limit_concurrency: int | None = None
+    # Behind a reverse proxy the client address (and so the per-IP rate
+    # limits) comes from X-Forwarded-For, trusted only from these addresses.
+    proxy_headers: bool = True
+    forwarded_allow_ips: str = "127.0.0.1"
 
 
 class Settings:
     db: DbSettings = DbSettings()
     auth_jwt: AuthJWT = AuthJWT()
+    password_hashing: PasswordHashing = PasswordHashing()
+    kv: KvSettings = KvSettings()
+    service_auth: ServiceAuth = ServiceAuth()
+    projects: ProjectSettings = ProjectSettings()
+    rate_limit: RateLimitSettings = RateLimitSettings()
+    server: ServerSettings = ServerSettings()
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
@@ -1,31 +1,190 @@
+import asyncio
+import itertools
+from pathlib import Path
 from typing import Annotated
 
-from fastapi import Depends
-from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase
+from alembic import command
+from alembic.config import Config
+from fastapi import Depends, Request
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import DeclarativeBase, Session
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from config import Settings, get_settings
+from metrics import InstrumentedQueuePool
+
+
+ALEMBIC_CONFIG_PATH = Path(__file__).resolve().parent.parent / "alembic.ini"
+READ_PRIMARY_COOKIE = "read_primary"
 
 
 class Base(DeclarativeBase):
     pass
 
 
-async def get_engine(
-    settings: Annotated[Settings, Depends(get_settings, use_cache=False)],
-):
-    engine = create_async_engine(settings.db.database_url)
-    yield engine
-    await engine.dispose()
+def create_engine(settings: Settings, url: str | None = None) -> AsyncEngine:
+    db = settings.db
+    return create_async_engine(
+        url or db.database_url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=db.db_pool_size,
+        max_overflow=db.db_max_overflow,
+        pool_timeout=db.db_pool_timeout,
+        pool_recycle=db.db_pool_recycle,
+        pool_pre_ping=db.db_pool_pre_ping,
+        connect_args={"statement_cache_size": db.db_statement_cache_size},
+    )
+
+
+def is_foreign_key_violation(exc: IntegrityError) -> bool:
+    # asyncpg reports the SQLSTATE, SQLite only the message.
+    return getattr(exc.orig, "sqlstate", None) == "23503" or (
+        "FOREIGN KEY constraint failed" in str(exc.orig)
+    )
+
+
+def dialect_insert(session: AsyncSession, entity):
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(entity)
+    return postgresql.insert(entity)
+
+
+def run_migrations(connection: Connection, revision: str = "head") -> None:
+    config = Config(str(ALEMBIC_CONFIG_PATH))
+    config.attributes["connection"] = connection
+    command.upgrade(config, revision)
+
+
+async def migrate(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(run_migrations)
+
+
+class ReplicaSet:
+    def __init__(self, engines: list[AsyncEngine]):
+        self.engines = engines
+        self.session_makers = [
+            async_sessionmaker(engine, expire_on_commit=False) for engine in engines
+        ]
+        self.healthy: list[async_sessionmaker] = []
+        self.counter = itertools.count()
+
+    def choose(self) -> async_sessionmaker | None:
+        healthy = self.healthy
+        if not healthy:
+            return None
+        return healthy[next(self.counter) % len(healthy)]
+
+    async def is_healthy(self, engine: AsyncEngine, timeout: float) -> bool:
+        try:
+            async with asyncio.timeout(timeout):
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+        except Exception:  # pylint: disable=broad-exception-caught
+            return False
+        return True
+
+    async def check(self, timeout: float) -> None:
+        results = await asyncio.gather(
+            *(self.is_healthy(engine, timeout) for engine in self.engines)
+        )
+        self.healthy = [
+            session_maker
+            for session_maker, healthy in zip(self.session_makers, results)
+            if healthy
+        ]
+
+    async def monitor(self, interval: float, timeout: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.check(timeout)
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+
+def create_replica_set(settings: Settings) -> ReplicaSet:
+    return ReplicaSet(
+        [create_engine(settings, url) for url in settings.db.db_replica_urls]
+    )
 
 
-async def get_session_maker(engine: Annotated[AsyncEngine, Depends(get_engine)]):
-    session_maker = async_sessionmaker(engine)
-    yield session_maker
+@event.listens_for(Session, "after_commit")
+def mark_committed(session: Session) -> None:
+    session.info["committed"] = True
+
+
+class ReadYourWritesMiddleware:
+    # Once a request commits, tell the client to read from the primary for a
+    # while so its next GET does not hit a replica that has not caught up.
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and scope.get("state", {}).get(
+                "committed"
+            ):
+                max_age = get_settings().db.db_read_your_writes_seconds
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{READ_PRIMARY_COOKIE}=1; Max-Age={max_age}; Path=/; "
+                    "HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+async def get_engine(request: Request) -> AsyncEngine:
+    return request.app.state.engine
+
+
+async def get_session_maker(request: Request) -> async_sessionmaker:
+    return request.app.state.session_maker
+
+
+async def get_replica_set(request: Request) -> ReplicaSet:
+    return request.app.state.replicas
 
 
 async def get_session(
+    request: Request,
     session_maker: Annotated[async_sessionmaker, Depends(get_session_maker)],
+):
+    async with session_maker() as session:
+        yield session
+        if session.info.get("committed"):
+            request.state.committed = True
+
+
+async def get_read_session_maker(
+    request: Request,
+    session_maker: Annotated[async_sessionmaker, Depends(get_session_maker)],
+    replicas: Annotated[ReplicaSet, Depends(get_replica_set)],
+) -> async_sessionmaker:
+    if READ_PRIMARY_COOKIE in request.cookies:
+        return session_maker
+    return replicas.choose() or session_maker
+
+
+async def get_read_session(
+    session_maker: Annotated[async_sessionmaker, Depends(get_read_session_maker)],
 ):
     async with session_maker() as session:
         yield session
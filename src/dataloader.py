@@ -0,0 +1,93 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, Iterable, TypeVar
+from weakref import WeakKeyDictionary
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from config import get_settings
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+# Every key requested before the loop runs the scheduled dispatch is fetched by
+# one batch_load call, and callers asking for the same key share one future.
+# Nothing outlives a batch, so results are never staler than their query.
+class DataLoader(Generic[K, V]):
+
+    def __init__(self, batch_load: Callable[[list[K]], Awaitable[dict[K, V]]]):
+        self.batch_load = batch_load
+        self.pending: dict[K, asyncio.Future] = {}
+        self.batches: set[asyncio.Task] = set()
+
+    async def load(self, key: K) -> V | None:
+        future = self.pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self.pending:
+                loop.call_soon(self.dispatch)
+            future = self.pending[key] = loop.create_future()
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[K]) -> list[V | None]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def dispatch(self) -> None:
+        batch, self.pending = self.pending, {}
+        task = asyncio.ensure_future(self.resolve(batch))
+        self.batches.add(task)
+        task.add_done_callback(self.batches.discard)
+
+    async def resolve(self, batch: dict[K, asyncio.Future]) -> None:
+        try:
+            results = await self.batch_load(list(batch))
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(key))
+
+
+# A batch serves many requests at once, so it runs in its own session rather
+# than borrowing one request's and only sees committed data. That session is an
+# extra pooled connection, so all loaders of an engine share a semaphore of
+# db_dataloader_connections.
+class EngineDataLoaders(Generic[K, V]):
+    connection_limits: WeakKeyDictionary[AsyncEngine, asyncio.Semaphore] = (
+        WeakKeyDictionary()
+    )
+
+    def __init__(
+        self, batch_load: Callable[[list[K], AsyncSession], Awaitable[dict[K, V]]]
+    ):
+        self.batch_load = batch_load
+        self.loaders: WeakKeyDictionary[AsyncEngine, DataLoader[K, V]] = (
+            WeakKeyDictionary()
+        )
+
+    def for_session(self, session: AsyncSession) -> DataLoader[K, V]:
+        engine = session.bind
+        loader = self.loaders.get(engine)
+        if loader is None:
+            connection_limit = self.get_connection_limit(engine)
+
+            async def batch_load(keys: list[K]) -> dict[K, V]:
+                async with connection_limit, AsyncSession(
+                    engine, expire_on_commit=False
+                ) as session:
+                    return await self.batch_load(keys, session)
+
+            loader = self.loaders[engine] = DataLoader(batch_load)
+        return loader
+
+    def get_connection_limit(self, engine: AsyncEngine) -> asyncio.Semaphore:
+        connection_limit = self.connection_limits.get(engine)
+        if connection_limit is None:
+            connection_limit = self.connection_limits[engine] = asyncio.Semaphore(
+                get_settings().db.db_dataloader_connections
+            )
+        return connection_limit
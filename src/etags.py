@@ -0,0 +1,50 @@
+import hashlib
+from typing import Any
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha256("\x1f".join(map(str, parts)).encode("utf-8"))
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(header: str | None, etag: str, weak: bool = False) -> bool:
+    if header is None:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    return etag_matches(request.headers.get("If-None-Match"), etag, weak=True)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+def version_etag(kind: str, entity_id: int, version: int) -> str:
+    return f'"{kind}-{entity_id}-{version}"'
+
+
+def if_match_versions(request: Request, kind: str, entity_id: int) -> list[int] | None:
+    header = request.headers.get("If-Match")
+    if header is None:
+        return None
+    versions = []
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return None
+        prefix, _, version = candidate.strip('"').rpartition("-")
+        if prefix == f"{kind}-{entity_id}" and version.isdigit():
+            versions.append(int(version))
+    return versions
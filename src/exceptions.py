@@ -9,3 +9,20 @@ SelfActionRequired = HTTPException(
 DatabaseError = HTTPException(
     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database error occurred"
 )
+
+InvalidCursor = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor"
+)
+
+PreconditionFailed = HTTPException(
+    status_code=status.HTTP_412_PRECONDITION_FAILED,
+    detail="Resource has been modified",
+)
+
+
+def too_many_requests(retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests, try again later",
+        headers={"Retry-After": str(retry_after)},
+    )
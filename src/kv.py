@@ -0,0 +1,96 @@
+import time
+from functools import lru_cache
+from typing import Protocol
+
+from config import get_settings
+
+
+class KeyValuePipeline(Protocol):
+    def set(
+        self, key: str, value: str | int, ex: int | None = None, nx: bool = False
+    ) -> "KeyValuePipeline": ...
+
+    async def execute(self) -> list: ...
+
+
+class KeyValueClient(Protocol):
+    async def get(self, key: str) -> str | bytes | None: ...
+
+    async def mget(self, keys: list[str]) -> list[str | bytes | None]: ...
+
+    async def set(
+        self, key: str, value: str | int, ex: int | None = None, nx: bool = False
+    ) -> bool | None: ...
+
+    async def incr(self, key: str) -> int: ...
+
+    def pipeline(self, transaction: bool = True) -> KeyValuePipeline: ...
+
+
+class InMemoryPipeline:
+    def __init__(self, client: "InMemoryKeyValueClient"):
+        self.client = client
+        self.commands: list[tuple[str, str | int, int | None, bool]] = []
+
+    def set(
+        self, key: str, value: str | int, ex: int | None = None, nx: bool = False
+    ) -> "InMemoryPipeline":
+        self.commands.append((key, value, ex, nx))
+        return self
+
+    async def execute(self) -> list[bool | None]:
+        return [await self.client.set(*command) for command in self.commands]
+
+
+class InMemoryKeyValueClient:
+    def __init__(self):
+        self._data: dict[str, str] = {}
+        self._expires_at: dict[str, float] = {}
+
+    def _purge(self, key: str) -> None:
+        expires_at = self._expires_at.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._expires_at[key]
+            self._data.pop(key, None)
+
+    async def get(self, key: str) -> str | None:
+        self._purge(key)
+        return self._data.get(key)
+
+    async def mget(self, keys: list[str]) -> list[str | None]:
+        return [await self.get(key) for key in keys]
+
+    async def set(
+        self, key: str, value: str | int, ex: int | None = None, nx: bool = False
+    ) -> bool | None:
+        self._purge(key)
+        if nx and key in self._data:
+            return None
+        self._data[key] = str(value)
+        if ex is None:
+            self._expires_at.pop(key, None)
+        else:
+            self._expires_at[key] = time.monotonic() + ex
+        return True
+
+    async def incr(self, key: str) -> int:
+        self._purge(key)
+        value = int(self._data.get(key, 0)) + 1
+        self._data[key] = str(value)
+        return value
+
+    def pipeline(self, transaction: bool = True) -> InMemoryPipeline:
+        return InMemoryPipeline(self)
+
+
+@lru_cache
+def get_kv_client() -> KeyValueClient:
+    # Only called when a kv backend is selected; a per-process fake would
+    # silently lose the state those backends exist to share.
+    kv_url = get_settings().kv.kv_url
+    if kv_url is None:
+        raise ValueError("KV_URL must be set when a kv backend is selected")
+
+    from redis.asyncio import Redis  # pylint: disable=import-outside-toplevel
+
+    return Redis.from_url(kv_url)
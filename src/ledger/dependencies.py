@@ -0,0 +1,22 @@
+import hmac
+from typing import Annotated
+
+from fastapi import Depends
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from config import Settings, get_settings
+from ledger.exceptions import InvalidServiceToken
+
+
+service_bearer = HTTPBearer(scheme_name="ServiceToken")
+
+
+def verify_service_token(
+    credentials: Annotated[HTTPAuthorizationCredentials, Depends(service_bearer)],
+    settings: Annotated[Settings, Depends(get_settings)],
+) -> None:
+    service_token = settings.service_auth.service_token
+    if service_token is None or not hmac.compare_digest(
+        credentials.credentials.encode(), service_token.encode()
+    ):
+        raise InvalidServiceToken
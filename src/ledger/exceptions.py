@@ -0,0 +1,22 @@
+from fastapi import HTTPException, status
+
+
+InsufficientFunds = HTTPException(
+    status_code=status.HTTP_409_CONFLICT, detail="Insufficient funds"
+)
+
+IdempotencyKeyReused = HTTPException(
+    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    detail="Idempotency key was already used for a different operation",
+)
+
+InvalidServiceToken = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid service token"
+)
+
+
+def batch_too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Batch may contain at most {max_size} entries",
+    )
@@ -0,0 +1,232 @@
+from decimal import Decimal
+
+from sqlalchemy import case, insert, select, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import dialect_insert
+from exceptions import DatabaseError
+from ledger.exceptions import IdempotencyKeyReused, InsufficientFunds
+from ledger.models import TransactionModel
+from ledger.schemas import (
+    BatchEntryResultSchema,
+    BatchEntrySchema,
+    BatchEntryStatus,
+    TransactionKind,
+)
+from users.exceptions import Usernot_found
+from users.models import UserModel
+
+
+async def find_transaction(
+    session: AsyncSession, user_id: int, idempotency_key: str | None
+) -> TransactionModel | None:
+    if idempotency_key is None:
+        return None
+    return await session.scalar(
+        select(TransactionModel).where(
+            TransactionModel.user_id == user_id,
+            TransactionModel.idempotency_key == idempotency_key,
+        )
+    )
+
+
+def check_replay(
+    transaction: TransactionModel, kind: TransactionKind, amount: Decimal
+) -> TransactionModel:
+    if transaction.kind != kind.value or transaction.amount != amount:
+        raise IdempotencyKeyReused
+    return transaction
+
+
+async def apply_transaction(
+    session: AsyncSession,
+    user_id: int,
+    kind: TransactionKind,
+    amount: Decimal,
+    idempotency_key: str | None = None,
+) -> TransactionModel:
+    # The balance UPDATE takes the user's row lock, so concurrent operations on
+    # one account (including retries with the same key) run one after another.
+    signed_amount = -amount if kind is TransactionKind.DEBIT else amount
+    statement = (
+        update(UserModel)
+        .where(UserModel.id == user_id)
+        .values(money_balance=UserModel.money_balance + signed_amount)
+        .returning(UserModel.money_balance)
+    )
+    if kind is TransactionKind.DEBIT:
+        statement = statement.where(UserModel.money_balance >= amount)
+
+    balance = await session.scalar(statement)
+    if balance is None:
+        await session.rollback()
+        replayed = await find_transaction(session, user_id, idempotency_key)
+        if replayed is not None:
+            return check_replay(replayed, kind, signed_amount)
+        if kind is TransactionKind.DEBIT:
+            raise InsufficientFunds
+        raise Usernot_found
+
+    transaction = await session.scalar(
+        dialect_insert(session, TransactionModel)
+        .values(
+            user_id=user_id,
+            kind=kind.value,
+            amount=signed_amount,
+            balance_after=balance,
+            idempotency_key=idempotency_key,
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "idempotency_key"])
+        .returning(TransactionModel)
+    )
+    if transaction is None:
+        await session.rollback()
+        replayed = await find_transaction(session, user_id, idempotency_key)
+        return check_replay(replayed, kind, signed_amount)
+
+    await session.commit()
+    return transaction
+
+
+async def post_transaction(
+    session: AsyncSession,
+    user_id: int,
+    kind: TransactionKind,
+    amount: Decimal,
+    idempotency_key: str | None = None,
+) -> TransactionModel:
+    try:
+        return await apply_transaction(session, user_id, kind, amount, idempotency_key)
+    except SQLAlchemyError as exc:
+        await session.rollback()
+        raise DatabaseError from exc
+
+
+async def lock_balances(session: AsyncSession, user_ids: set[int]) -> dict:
+    # Accounts are locked in id order so that concurrent batches cannot
+    # deadlock; no other ledger write can interleave once this returns.
+    result = await session.execute(
+        select(UserModel.id, UserModel.money_balance)
+        .where(UserModel.id.in_(user_ids))
+        .order_by(UserModel.id)
+        .with_for_update()
+    )
+    return dict(result.all())
+
+
+async def find_batch_transactions(
+    session: AsyncSession, entries: list[BatchEntrySchema]
+) -> dict:
+    transactions = await session.scalars(
+        select(TransactionModel).where(
+            tuple_(TransactionModel.user_id, TransactionModel.idempotency_key).in_(
+                {(entry.user_id, entry.idempotency_key) for entry in entries}
+            )
+        )
+    )
+    return {
+        (transaction.user_id, transaction.idempotency_key): transaction
+        for transaction in transactions
+    }
+
+
+async def write_batch(
+    session: AsyncSession, balances: dict, new_transactions: list[TransactionModel]
+) -> None:
+    changed_balances = {
+        transaction.user_id: balances[transaction.user_id]
+        for transaction in new_transactions
+    }
+    await session.execute(
+        update(UserModel)
+        .where(UserModel.id.in_(changed_balances))
+        .values(money_balance=case(changed_balances, value=UserModel.id))
+        .execution_options(synchronize_session=False)
+    )
+    transaction_ids = await session.scalars(
+        insert(TransactionModel).returning(
+            TransactionModel.id, sort_by_parameter_order=True
+        ),
+        [
+            {
+                "user_id": transaction.user_id,
+                "kind": transaction.kind,
+                "amount": transaction.amount,
+                "balance_after": transaction.balance_after,
+                "idempotency_key": transaction.idempotency_key,
+            }
+            for transaction in new_transactions
+        ],
+    )
+    for transaction, transaction_id in zip(new_transactions, transaction_ids):
+        transaction.id = transaction_id
+
+
+async def apply_batch(
+    session: AsyncSession, entries: list[BatchEntrySchema]
+) -> list[BatchEntryResultSchema]:
+    balances = await lock_balances(session, {entry.user_id for entry in entries})
+    recorded = await find_batch_transactions(session, entries)
+
+    results = []
+    new_transactions: list[TransactionModel] = []
+    for entry in entries:
+        key = (entry.user_id, entry.idempotency_key)
+        signed_amount = (
+            -entry.amount if entry.kind is TransactionKind.DEBIT else entry.amount
+        )
+        result = BatchEntryResultSchema(
+            user_id=entry.user_id,
+            idempotency_key=entry.idempotency_key,
+            status=BatchEntryStatus.APPLIED,
+        )
+        results.append((result, recorded.get(key)))
+        if key in recorded:
+            previous = recorded[key]
+            result.status = (
+                BatchEntryStatus.DUPLICATE
+                if previous.kind == entry.kind.value
+                and previous.amount == signed_amount
+                else BatchEntryStatus.IDEMPOTENCY_KEY_REUSED
+            )
+            continue
+
+        balance = balances.get(entry.user_id)
+        if balance is None:
+            result.status = BatchEntryStatus.USER_NOT_FOUND
+            continue
+        if balance + signed_amount < 0:
+            result.status = BatchEntryStatus.INSUFFICIENT_FUNDS
+            continue
+
+        balances[entry.user_id] = balance + signed_amount
+        recorded[key] = TransactionModel(
+            user_id=entry.user_id,
+            kind=entry.kind.value,
+            amount=signed_amount,
+            balance_after=balances[entry.user_id],
+            idempotency_key=entry.idempotency_key,
+        )
+        new_transactions.append(recorded[key])
+        results[-1] = (result, recorded[key])
+
+    if new_transactions:
+        await write_batch(session, balances, new_transactions)
+    await session.commit()
+
+    for result, transaction in results:
+        if transaction is not None:
+            result.transaction_id = transaction.id
+            result.balance_after = transaction.balance_after
+    return [result for result, _ in results]
+
+
+async def post_batch(
+    session: AsyncSession, entries: list[BatchEntrySchema]
+) -> list[BatchEntryResultSchema]:
+    try:
+        return await apply_batch(session, entries)
+    except SQLAlchemyError as exc:
+        await session.rollback()
+        raise DatabaseError from exc
@@ -0,0 +1,114 @@
+from typing import Annotated, List
+
+from fastapi import APIRouter, Depends, Header, Path, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import Settings, get_settings
+from database import get_read_session, get_session
+from exceptions import SelfActionRequired
+from ledger.dependencies import verify_service_token
+from ledger.exceptions import batch_too_large
+from ledger.models import TransactionModel
+from ledger.operations import post_batch, post_transaction
+from ledger.schemas import (
+    BatchEntryResultSchema,
+    BatchEntryStatus,
+    BatchRequestSchema,
+    TransactionAmountSchema,
+    TransactionKind,
+    TransactionSchema,
+)
+from pagination import PageParams, finish_page, get_page_params, paginate
+from query_budget import query_budget
+from responses import schema_response
+from users.cache import TokenCache, get_token_cache
+from users.dependencies import get_user_from_access_token
+from users.schemas import UserSchema
+
+
+ledger_router = APIRouter(tags=["ledger"])
+
+
+@ledger_router.post("/users/{user_id}/credit", response_model=TransactionSchema)
+@query_budget(5)
+async def credit(
+    user_id: Annotated[int, Path(title="id of current user")],
+    amount_schema: TransactionAmountSchema,
+    user: Annotated[UserSchema, Depends(get_user_from_access_token)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+    token_cache: Annotated[TokenCache, Depends(get_token_cache)],
+    idempotency_key: Annotated[str | None, Header(max_length=255)] = None,
+) -> TransactionSchema:
+    if user_id != user.id:
+        raise SelfActionRequired
+    transaction = await post_transaction(
+        session, user_id, TransactionKind.CREDIT, amount_schema.amount, idempotency_key
+    )
+    token_cache.invalidate_user(user_id)
+    return schema_response(TransactionSchema, transaction)
+
+
+@ledger_router.post("/users/{user_id}/debit", response_model=TransactionSchema)
+@query_budget(5)
+async def debit(
+    user_id: Annotated[int, Path(title="id of current user")],
+    amount_schema: TransactionAmountSchema,
+    user: Annotated[UserSchema, Depends(get_user_from_access_token)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+    token_cache: Annotated[TokenCache, Depends(get_token_cache)],
+    idempotency_key: Annotated[str | None, Header(max_length=255)] = None,
+) -> TransactionSchema:
+    if user_id != user.id:
+        raise SelfActionRequired
+    transaction = await post_transaction(
+        session, user_id, TransactionKind.DEBIT, amount_schema.amount, idempotency_key
+    )
+    token_cache.invalidate_user(user_id)
+    return schema_response(TransactionSchema, transaction)
+
+
+@ledger_router.get(
+    "/users/{user_id}/transactions", response_model=List[TransactionSchema]
+)
+@query_budget(2)
+async def get_transactions(
+    user_id: Annotated[int, Path(title="id of current user")],
+    response: Response,
+    page: Annotated[PageParams, Depends(get_page_params)],
+    user: Annotated[UserSchema, Depends(get_user_from_access_token)],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
+) -> List[TransactionSchema]:
+    if user_id != user.id:
+        raise SelfActionRequired
+    result = await session.execute(
+        paginate(
+            select(TransactionModel).where(TransactionModel.user_id == user_id),
+            TransactionModel.id,
+            page,
+        )
+    )
+    transactions = finish_page(result.scalars().all(), page, response)
+    return schema_response(List[TransactionSchema], transactions, response)
+
+
+@ledger_router.post(
+    "/internal/ledger/batch",
+    response_model=List[BatchEntryResultSchema],
+    dependencies=[Depends(verify_service_token)],
+)
+async def apply_ledger_batch(
+    batch: BatchRequestSchema,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    settings: Annotated[Settings, Depends(get_settings)],
+    token_cache: Annotated[TokenCache, Depends(get_token_cache)],
+) -> List[BatchEntryResultSchema]:
+    max_size = settings.service_auth.ledger_batch_max_size
+    if len(batch.entries) > max_size:
+        raise batch_too_large(max_size)
+
+    results = await post_batch(session, batch.entries)
+    for result in results:
+        if result.status is BatchEntryStatus.APPLIED:
+            token_cache.invalidate_user(result.user_id)
+    return schema_response(List[BatchEntryResultSchema], results)
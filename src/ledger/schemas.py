@@ -0,0 +1,96 @@
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Annotated, Literal
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class TransactionKind(str, Enum):
+    OPENING = "opening"
+    CREDIT = "credit"
+    DEBIT = "debit"
+
+
+class TransactionAmountSchema(BaseModel):
+    amount: Annotated[Decimal, Field(gt=0, decimal_places=10, max_digits=30)]
+
+    model_config = {"json_schema_extra": {"examples": [{"amount": "25.00"}]}}
+
+
+class TransactionSchema(BaseModel):
+    id: int
+    kind: TransactionKind
+    amount: Decimal
+    balance_after: Decimal
+    idempotency_key: str | None
+    created_at: datetime
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "examples": [
+                {
+                    "id": 1,
+                    "kind": "debit",
+                    "amount": "-25.00",
+                    "balance_after": "975.00",
+                    "idempotency_key": "6f1c2c1e-charge-42",
+                    "created_at": "2026-10-18T12:00:00Z",
+                }
+            ]
+        },
+        from_attributes=True,
+    )
+
+
+class BatchEntryStatus(str, Enum):
+    APPLIED = "applied"
+    DUPLICATE = "duplicate"
+    IDEMPOTENCY_KEY_REUSED = "idempotency_key_reused"
+    INSUFFICIENT_FUNDS = "insufficient_funds"
+    USER_NOT_FOUND = "user_not_found"
+
+
+class BatchEntrySchema(TransactionAmountSchema):
+    user_id: int
+    kind: Literal[TransactionKind.CREDIT, TransactionKind.DEBIT]
+    idempotency_key: Annotated[str, Field(max_length=255)]
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "user_id": 1,
+                    "kind": "debit",
+                    "amount": "25.00",
+                    "idempotency_key": "6f1c2c1e-charge-42",
+                }
+            ]
+        }
+    }
+
+
+class BatchRequestSchema(BaseModel):
+    entries: Annotated[list[BatchEntrySchema], Field(min_length=1)]
+
+
+class BatchEntryResultSchema(BaseModel):
+    user_id: int
+    idempotency_key: str
+    status: BatchEntryStatus
+    transaction_id: int | None = None
+    balance_after: Decimal | None = None
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "user_id": 1,
+                    "idempotency_key": "6f1c2c1e-charge-42",
+                    "status": "applied",
+                    "transaction_id": 17,
+                    "balance_after": "975.00",
+                }
+            ]
+        }
+    }
@@ -1,40 +1,135 @@
-import os
+import asyncio
 from contextlib import asynccontextmanager
 
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI
-from sqlalchemy.ext.asyncio import create_async_engine
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
-from config import get_settings
-from database import Base
+from config import Settings, get_settings
+from database import (
+    ReadYourWritesMiddleware,
+    create_engine,
+    create_replica_set,
+    migrate,
+)
+from metrics import (
+    MetricsMiddleware,
+    enable_multiprocess_metrics,
+    instrument_engine,
+    mark_process_dead,
+    monitor_event_loop_lag,
+)
+from query_budget import QueryBudgetMiddleware
+from rate_limit import get_rate_limiter
 from router import main_router
+from users.hashing import get_password_hasher
+from users.keys import get_key_ring
+from users.revocation import get_token_version_store
 
 
 load_dotenv()
 
 
 @asynccontextmanager
-async def test_db_connection(*args):
+async def lifespan(application: FastAPI):
+    settings = get_settings()
+    # Build the key ring and the kv-backed stores up front so a bad key config
+    # or a missing KV_URL fails startup instead of the first login.
+    get_key_ring(settings)
+    get_token_version_store()
+    get_rate_limiter()
+    engine = create_engine(settings)
+    application.state.engine = engine
+    application.state.session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    replicas = create_replica_set(settings)
+    application.state.replicas = replicas
+    instrument_engine(engine)
+    for index, replica_engine in enumerate(replicas.engines):
+        instrument_engine(replica_engine, f"replica-{index}")
+    loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
     try:
-        engine = create_async_engine(get_settings().db.database_url)
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-        yield
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
     except Exception as e:
         print("❌DB connection failed")
         print(e)
-    finally:
-        await engine.dispose()
+    db = settings.db
+    await replicas.check(db.db_replica_health_check_timeout)
+    replica_monitor = asyncio.create_task(
+        replicas.monitor(
+            db.db_replica_health_check_interval, db.db_replica_health_check_timeout
+        )
+    )
+    yield
+    replica_monitor.cancel()
+    loop_lag_monitor.cancel()
+    get_password_hasher().shutdown()
+    get_password_hasher.cache_clear()
+    await engine.dispose()
+    await replicas.dispose()
+    mark_process_dead()
 
 
 app = FastAPI(
-    lifespan=test_db_connection,
+    lifespan=lifespan,
     root_path="/api/v1",
+    default_response_class=ORJSONResponse,
     title="user-service",
     version="1.0",
 )
+app.add_middleware(QueryBudgetMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.include_router(main_router)
 
+
+async def migrate_database(settings: Settings) -> None:
+    engine = create_engine(settings)
+    try:
+        await migrate(engine)
+    finally:
+        await engine.dispose()
+
+
+def run() -> None:
+    settings = get_settings()
+    server = settings.server
+    rate_limit = settings.rate_limit
+    if (
+        server.workers > 1
+        and rate_limit.rate_limit_enabled
+        and rate_limit.rate_limit_backend == "memory"
+    ):
+        raise ValueError(
+            f"WORKERS={server.workers} needs RATE_LIMIT_BACKEND=kv: "
+            "the memory store keeps separate counters in every worker"
+        )
+
+    # Migrations run once here, before any worker starts; each worker's
+    # lifespan only checks that its own pool can reach the database.
+    if settings.db.db_migrate_on_startup:
+        asyncio.run(migrate_database(settings))
+
+    if server.workers > 1:
+        enable_multiprocess_metrics()
+    uvicorn.run(
+        "main:app",
+        host=server.host,
+        port=server.port,
+        workers=server.workers,
+        loop=server.loop,
+        http=server.http,
+        backlog=server.backlog,
+        timeout_keep_alive=server.timeout_keep_alive,
+        timeout_graceful_shutdown=server.timeout_graceful_shutdown,
+        limit_concurrency=server.limit_concurrency,
+        proxy_headers=server.proxy_headers,
+        forwarded_allow_ips=server.forwarded_allow_ips,
+    )
+
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT")))
+    run()
@@ -0,0 +1,227 @@
+import asyncio
+import collections
+import os
+import tempfile
+import time
+from contextvars import ContextVar
+
+from fastapi import APIRouter, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests", ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"]
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed per HTTP request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+HTTP_REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent executing SQL per HTTP request",
+    ["method", "route"],
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "SQL statement latency", buckets=FAST_BUCKETS
+)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "SQL statements that raised")
+# Pool gauges are summed over live worker processes when running multi-process.
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Connections opened beyond pool_size",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUT_DURATION = Histogram(
+    "db_pool_checkout_duration_seconds",
+    "Time to obtain a pooled connection, including waiting for a free one",
+    ["engine"],
+    buckets=FAST_BUCKETS,
+)
+PASSWORD_HASHING_DURATION = Histogram(
+    "password_hashing_duration_seconds", "Time spent in bcrypt", ["operation"]
+)
+JWT_DURATION = Histogram(
+    "jwt_duration_seconds",
+    "Time spent encoding and decoding JWTs",
+    ["operation"],
+    buckets=FAST_BUCKETS,
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between a scheduled wake-up and the event loop running it",
+    buckets=FAST_BUCKETS,
+)
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: collections.Counter[str] = collections.Counter()
+
+
+current_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+
+def enable_multiprocess_metrics() -> None:
+    # Must run before workers are spawned: prometheus_client picks file-backed
+    # values at import time, and each worker inherits the directory from here.
+    if not os.environ.get(MULTIPROC_DIR_ENV):
+        os.environ[MULTIPROC_DIR_ENV] = tempfile.mkdtemp(prefix="prometheus-")
+
+
+def mark_process_dead() -> None:
+    if os.environ.get(MULTIPROC_DIR_ENV):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    # Pool metrics are labelled with the engine's role (primary, replica-N),
+    # set by instrument_engine and carried over when dispose() recreates the
+    # pool.
+    role = "primary"
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        pool.role = self.role
+        return pool
+
+    def _update_gauges(self) -> None:
+        DB_POOL_CHECKED_OUT.labels(self.role).set(self.checkedout())
+        DB_POOL_OVERFLOW.labels(self.role).set(max(self.overflow(), 0))
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_DURATION.labels(self.role).observe(
+                time.perf_counter() - start
+            )
+            self._update_gauges()
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        self._update_gauges()
+
+
+def before_cursor_execute(conn, *_) -> None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def record_query(conn, statement: str) -> None:
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    DB_QUERY_DURATION.observe(duration)
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += duration
+        stats.statements[statement] += 1
+
+
+def after_cursor_execute(conn, _cursor, statement, *_) -> None:
+    record_query(conn, statement)
+
+
+def handle_error(context) -> None:
+    # A failed statement (e.g. an IntegrityError) never reaches
+    # after_cursor_execute; without this its start time would stay on the
+    # pooled connection and be popped by the next statement.
+    conn = context.connection
+    if conn is None or context.statement is None or not conn.info.get("query_start"):
+        return
+    DB_QUERY_ERRORS.inc()
+    record_query(conn, context.statement)
+
+
+def instrument_engine(engine: AsyncEngine, role: str = "primary") -> None:
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.role = role
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+        event.listen(sync_engine, "handle_error", handle_error)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(time.perf_counter() - start - interval, 0))
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            current_query_stats.reset(token)
+            route = scope.get("route")
+            labels = (scope["method"], route.path if route else "unmatched")
+            HTTP_REQUESTS.labels(*labels, status).inc()
+            HTTP_REQUEST_DURATION.labels(*labels).observe(duration)
+            HTTP_REQUEST_DB_QUERIES.labels(*labels).observe(stats.count)
+            HTTP_REQUEST_DB_DURATION.labels(*labels).observe(stats.duration)
+
+
+metrics_router = APIRouter(tags=["metrics"])
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    if not os.environ.get(MULTIPROC_DIR_ENV):
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,59 @@
+import base64
+import binascii
+from typing import Annotated, Sequence, TypeVar
+
+from fastapi import Query, Response
+from pydantic import BaseModel
+from sqlalchemy import Select
+from sqlalchemy.orm import InstrumentedAttribute
+
+from exceptions import InvalidCursor
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+T = TypeVar("T")
+
+
+class PageParams(BaseModel):
+    limit: int
+    after: int | None = None
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidCursor from exc
+
+
+async def get_page_params(
+    limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+    after: Annotated[str | None, Query()] = None,
+) -> PageParams:
+    return PageParams(
+        limit=limit, after=decode_cursor(after) if after is not None else None
+    )
+
+
+def paginate(
+    statement: Select, id_column: InstrumentedAttribute, page: PageParams
+) -> Select:
+    if page.after is not None:
+        statement = statement.where(id_column > page.after)
+    return statement.order_by(id_column).limit(page.limit + 1)
+
+
+def finish_page(items: Sequence[T], page: PageParams, response: Response) -> list[T]:
+    items = list(items)
+    if len(items) > page.limit:
+        items = items[: page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(items[-1].id)
+    return items
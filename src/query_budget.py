@@ -0,0 +1,109 @@
+import logging
+import time
+from typing import Callable, TypeVar
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import get_settings
+from metrics import QueryStats, current_query_stats
+
+
+logger = logging.getLogger("uvicorn.error").getChild("queries")
+
+Endpoint = TypeVar("Endpoint", bound=Callable)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(
+    max_queries: int | None = None, repeated_statements: bool = False
+) -> Callable[[Endpoint], Endpoint]:
+    # Declares how many SQL statements one request to the route may issue.
+    # repeated_statements allows intentional per-item statements (e.g. one
+    # INSERT per streamed chunk) that would otherwise look like an N+1.
+    def decorator(endpoint: Endpoint) -> Endpoint:
+        endpoint.query_budget = max_queries
+        endpoint.repeated_statements = repeated_statements
+        return endpoint
+
+    return decorator
+
+
+def route_name(scope: Scope) -> str:
+    route = scope.get("route")
+    return f"{scope['method']} {route.path if route else scope['path']}"
+
+
+def find_violations(scope: Scope, stats: QueryStats) -> list[str]:
+    violations = []
+    endpoint = getattr(scope.get("route"), "endpoint", None)
+    budget = getattr(endpoint, "query_budget", None)
+    if budget is not None and stats.count > budget:
+        violations.append(f"{stats.count} queries, budget is {budget}")
+    if getattr(endpoint, "repeated_statements", False):
+        return violations
+
+    threshold = get_settings().db.db_n_plus_one_threshold
+    for statement, count in stats.statements.items():
+        if count >= threshold:
+            violations.append(f"possible N+1, {count}x: {' '.join(statement.split())}")
+    return violations
+
+
+def check_query_budget(scope: Scope, stats: QueryStats, elapsed: float) -> None:
+    db = get_settings().db
+    if db.db_log_queries:
+        logger.info(
+            "%s: %d queries in %.1f ms",
+            route_name(scope),
+            stats.count,
+            stats.duration * 1000,
+        )
+
+    violations = find_violations(scope, stats)
+    if not violations:
+        return
+    message = f"{route_name(scope)} ({elapsed * 1000:.1f} ms): " + "; ".join(violations)
+    if db.db_query_budget_enforce:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class QueryBudgetMiddleware:
+    # Reports the request's SQL count and time in Server-Timing and checks them
+    # against the route's budget. Statements run after the response has
+    # started (streamed bodies) are not included.
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = current_query_stats.get()
+        token = None
+        if stats is None:
+            stats = QueryStats()
+            token = current_query_stats.set(stats)
+        start = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                check_query_budget(scope, stats, elapsed)
+                MutableHeaders(scope=message).append(
+                    "server-timing",
+                    f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries", '
+                    f"app;dur={elapsed * 1000:.2f}",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if token is not None:
+                current_query_stats.reset(token)
@@ -0,0 +1,81 @@
+import math
+import time
+from functools import lru_cache
+
+from cache import TTLCache
+from config import get_settings
+from exceptions import too_many_requests
+from kv import KeyValueClient, get_kv_client
+
+
+class MemoryCounterStore:
+    def __init__(self, maxsize: int, ttl: float):
+        self.counters = TTLCache(maxsize, ttl)
+
+    async def get(self, key: str) -> int:
+        return self.counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        value = self.counters.get(key, 0) + 1
+        self.counters.set(key, value)
+        return value
+
+
+class KeyValueCounterStore:
+    def __init__(self, client: KeyValueClient, ttl: int, prefix: str = "rate_limit:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> int:
+        value = await self.client.get(f"{self.prefix}{key}")
+        return 0 if value is None else int(value)
+
+    async def incr(self, key: str) -> int:
+        # Create the counter together with its expiry, so a failure between
+        # two calls cannot leave a key that never expires. INCR keeps the TTL,
+        # and a bucket is only incremented during its own window, well before
+        # the key can expire.
+        await self.client.set(f"{self.prefix}{key}", 0, ex=self.ttl, nx=True)
+        return await self.client.incr(f"{self.prefix}{key}")
+
+
+class SlidingWindowRateLimiter:
+    # Sliding window counter: the previous fixed window's count is weighted by
+    # how much of it still overlaps the sliding window. Rejected attempts are
+    # counted too, so a client that keeps hammering stays blocked.
+    def __init__(self, store: MemoryCounterStore | KeyValueCounterStore, window: int):
+        self.store = store
+        self.window = window
+
+    async def hit(self, key: str, limit: int) -> None:
+        now = time.time()
+        bucket, elapsed = divmod(now, self.window)
+        current = await self.store.incr(f"{key}:{int(bucket)}")
+        previous = await self.store.get(f"{key}:{int(bucket) - 1}")
+        overlap = 1 - elapsed / self.window
+        if previous * overlap + current > limit:
+            raise too_many_requests(self.retry_after(previous, current, limit, elapsed))
+
+    def retry_after(
+        self, previous: int, current: int, limit: int, elapsed: float
+    ) -> int:
+        # Time until one more attempt fits under the limit.
+        if current < limit:
+            # The previous window's weight decays enough within this window.
+            wait = self.window * (1 - (limit - current - 1) / previous) - elapsed
+        else:
+            # Only the next window helps, once this one's weight decays.
+            wait = self.window - elapsed + self.window * (1 - (limit - 1) / current)
+        return max(1, math.ceil(wait))
+
+
+@lru_cache
+def get_rate_limiter() -> SlidingWindowRateLimiter:
+    settings = get_settings().rate_limit
+    window = settings.rate_limit_window_seconds
+    if settings.rate_limit_backend == "kv":
+        store = KeyValueCounterStore(get_kv_client(), ttl=2 * window)
+    else:
+        store = MemoryCounterStore(settings.rate_limit_cache_size, ttl=2 * window)
+    return SlidingWindowRateLimiter(store, window)
@@ -1,5 +1,8 @@
 from fastapi import APIRouter
 
+from ledger.router import ledger_router
+from metrics import metrics_router
+from scripts.bulk_router import bulk_router
 from scripts.projects_router import projects_router
 from scripts.scripts_router import scripts_router
 from users.router import users_router
@@ -8,5 +11,8 @@ from users.router import users_router
 main_router = APIRouter(prefix="")
 
 main_router.include_router(users_router)
+main_router.include_router(ledger_router)
 main_router.include_router(projects_router)
+main_router.include_router(bulk_router)
 main_router.include_router(scripts_router)
+main_router.include_router(metrics_router)
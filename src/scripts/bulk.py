@@ -0,0 +1,267 @@
+import hashlib
+import json
+import tarfile
+import zipfile
+from collections import Counter
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterable, AsyncIterator, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.concurrency import iterate_in_threadpool
+
+from config import get_settings
+from database import dialect_insert
+from scripts.exceptions import import_too_large, invalid_import_entry
+from scripts.models import BlobChunkModel, BlobModel, ScriptModel
+from scripts.schemas import ScriptImportConflictSchema, ScriptSchema
+from scripts.storage import read_source_codes, split_chunks
+
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_BATCH_SIZE = 100
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+async def iter_ndjson_entries(
+    stream: AsyncIterable[bytes],
+) -> AsyncIterator[tuple[str, bytes]]:
+    settings = get_settings().projects
+    max_line_size = settings.import_max_entry_size
+    buffer = bytearray()
+    total_size = 0
+    line_number = 0
+    async for data in stream:
+        total_size += len(data)
+        if total_size > settings.import_max_total_size:
+            raise import_too_large("body", settings.import_max_total_size)
+        # Only the new data is searched for line breaks, so a long line is
+        # not rescanned on every chunk.
+        *lines, rest = data.split(b"\n")
+        if lines:
+            lines[0] = bytes(buffer) + lines[0]
+            buffer = bytearray()
+        buffer += rest
+        for line in lines:
+            line_number += 1
+            if len(line) > max_line_size:
+                raise import_too_large(f"line {line_number}", max_line_size)
+            if line.strip():
+                yield parse_ndjson_line(line, line_number)
+        if len(buffer) > max_line_size:
+            raise import_too_large(f"line {line_number + 1}", max_line_size)
+    if buffer.strip():
+        yield parse_ndjson_line(bytes(buffer), line_number + 1)
+
+
+def parse_ndjson_line(line: bytes, line_number: int) -> tuple[str, bytes]:
+    try:
+        script = ScriptSchema.model_validate_json(line)
+    except ValidationError as exc:
+        raise invalid_import_entry(f"line {line_number}") from exc
+    return script.path, script.source_code.encode("utf-8")
+
+
+def read_entry(file, name: str, limit: int) -> bytes:
+    # Archive headers can lie about sizes, so read at most one byte past the
+    # limit instead of trusting them.
+    data = file.read(limit + 1)
+    if len(data) > limit:
+        raise import_too_large(name, limit)
+    return data
+
+
+def iter_tar_entries(file, max_entry_size: int) -> Iterator[tuple[str, bytes]]:
+    with tarfile.open(fileobj=file, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile():
+                entry = archive.extractfile(member)
+                yield member.name, read_entry(entry, member.name, max_entry_size)
+
+
+def iter_zip_entries(file, max_entry_size: int) -> Iterator[tuple[str, bytes]]:
+    with zipfile.ZipFile(file) as archive:
+        for info in archive.infolist():
+            if not info.is_dir():
+                with archive.open(info) as entry:
+                    yield info.filename, read_entry(
+                        entry, info.filename, max_entry_size
+                    )
+
+
+def iter_limited_entries(
+    file, content_type: str, max_entry_size: int, max_total_size: int
+) -> Iterator[tuple[str, bytes]]:
+    entries = (
+        iter_zip_entries if content_type == "application/zip" else iter_tar_entries
+    )
+    total_size = 0
+    try:
+        for path, data in entries(file, max_entry_size):
+            total_size += len(data)
+            if total_size > max_total_size:
+                raise import_too_large("archive", max_total_size)
+            yield path, data
+    except (tarfile.TarError, zipfile.BadZipFile) as exc:
+        raise invalid_import_entry("archive") from exc
+
+
+async def iter_archive_entries(
+    stream: AsyncIterable[bytes], content_type: str
+) -> AsyncIterator[tuple[str, bytes]]:
+    settings = get_settings().projects
+    with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as file:
+        async for data in stream:
+            file.write(data)
+        file.seek(0)
+        # Decompression is CPU-bound and blocking, so each entry is read in
+        # the threadpool rather than on the event loop.
+        entries = iter_limited_entries(
+            file,
+            content_type,
+            settings.import_max_entry_size,
+            settings.import_max_total_size,
+        )
+        async for entry in iterate_in_threadpool(entries):
+            yield entry
+
+
+async def import_scripts(
+    session: AsyncSession, project_id: int, entries: AsyncIterable[tuple[str, bytes]]
+) -> tuple[int, list[ScriptImportConflictSchema]]:
+    imported = 0
+    conflicts: list[ScriptImportConflictSchema] = []
+    batch: dict[str, bytes] = {}
+    async for path, data in entries:
+        conflict = check_entry(path, data, batch)
+        if conflict is not None:
+            conflicts.append(conflict)
+            continue
+        batch[path] = data
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            imported += await import_batch(session, project_id, batch, conflicts)
+            batch = {}
+    if batch:
+        imported += await import_batch(session, project_id, batch, conflicts)
+    return imported, conflicts
+
+
+def check_entry(
+    path: str, data: bytes, batch: dict[str, bytes]
+) -> ScriptImportConflictSchema | None:
+    if not path or len(path) > 255:
+        return ScriptImportConflictSchema(path=path[:255], detail="Invalid path")
+    if path in batch:
+        return ScriptImportConflictSchema(path=path, detail="Duplicate path")
+    try:
+        data.decode("utf-8")
+    except UnicodeDecodeError:
+        return ScriptImportConflictSchema(path=path, detail="Source is not UTF-8")
+    return None
+
+
+async def import_batch(
+    session: AsyncSession,
+    project_id: int,
+    batch: dict[str, bytes],
+    conflicts: list[ScriptImportConflictSchema],
+) -> int:
+    hashes = {path: hashlib.sha256(data).hexdigest() for path, data in batch.items()}
+    blob_data = {hashes[path]: data for path, data in batch.items()}
+
+    statement = dialect_insert(session, BlobModel).values(
+        [
+            {"hash": blob_hash, "size": len(data), "ref_count": 0}
+            for blob_hash, data in blob_data.items()
+        ]
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[BlobModel.hash],
+        set_={"ref_count": BlobModel.__table__.c.ref_count},
+    ).returning(BlobModel.hash, BlobModel.ref_count)
+    new_blobs = [
+        blob_hash
+        for blob_hash, ref_count in await session.execute(statement)
+        if ref_count == 0
+    ]
+    chunks = [
+        {"blob_hash": blob_hash, "seq": seq, "data": chunk}
+        for blob_hash in new_blobs
+        for seq, chunk in enumerate(split_chunks(blob_data[blob_hash]))
+    ]
+    if chunks:
+        await session.execute(insert(BlobChunkModel), chunks)
+
+    statement = dialect_insert(session, ScriptModel).values(
+        [
+            {
+                "path": path,
+                "blob_hash": hashes[path],
+                "size": len(data),
+                "parent_project_id": project_id,
+                "version": 1,
+            }
+            for path, data in batch.items()
+        ]
+    )
+    statement = statement.on_conflict_do_nothing(
+        index_elements=[ScriptModel.parent_project_id, ScriptModel.path]
+    ).returning(ScriptModel.path)
+    inserted = set((await session.execute(statement)).scalars())
+
+    references = Counter(hashes[path] for path in inserted)
+    blobs = BlobModel.__table__
+    if references:
+        await session.execute(
+            update(blobs)
+            .where(blobs.c.hash == bindparam("blob_hash"))
+            .values(ref_count=blobs.c.ref_count + bindparam("references")),
+            [
+                {"blob_hash": blob_hash, "references": count}
+                for blob_hash, count in references.items()
+            ],
+        )
+    unused_blobs = [blob_hash for blob_hash in new_blobs if blob_hash not in references]
+    if unused_blobs:
+        await session.execute(delete(BlobModel).where(BlobModel.hash.in_(unused_blobs)))
+
+    conflicts.extend(
+        ScriptImportConflictSchema(
+            path=path, detail="Script with this path already exists"
+        )
+        for path in batch
+        if path not in inserted
+    )
+    return len(inserted)
+
+
+async def export_scripts(
+    session_maker: async_sessionmaker, project_id: int
+) -> AsyncIterator[bytes]:
+    last_id = 0
+    async with session_maker() as session:
+        while True:
+            result = await session.execute(
+                select(ScriptModel.id, ScriptModel.path, ScriptModel.blob_hash)
+                .where(
+                    ScriptModel.parent_project_id == project_id,
+                    ScriptModel.id > last_id,
+                )
+                .order_by(ScriptModel.id)
+                .limit(EXPORT_BATCH_SIZE)
+            )
+            scripts = result.all()
+            if not scripts:
+                return
+            sources = await read_source_codes(
+                session, {script.blob_hash for script in scripts}
+            )
+            yield b"".join(
+                json.dumps(
+                    {"path": script.path, "source_code": sources[script.blob_hash]}
+                ).encode("utf-8")
+                + b"\n"
+                for script in scripts
+            )
+            last_id = scripts[-1].id
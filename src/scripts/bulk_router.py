@@ -0,0 +1,62 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database import get_read_session_maker, get_session
+from scripts.bulk import (
+    export_scripts,
+    import_scripts,
+    iter_archive_entries,
+    iter_ndjson_entries,
+)
+from scripts.dependencies import get_owned_project_id
+from scripts.exceptions import UnsupportedImportFormat
+from scripts.schemas import ScriptImportResultSchema
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARCHIVE_MEDIA_TYPES = {
+    "application/x-tar",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zip",
+}
+
+bulk_router = APIRouter(tags=["scripts"])
+
+
+@bulk_router.post(
+    "/projects/{project_id}/scripts/import", response_model=ScriptImportResultSchema
+)
+async def import_project_scripts(
+    project_id: Annotated[int, Depends(get_owned_project_id)],
+    request: Request,
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> ScriptImportResultSchema:
+    content_type = request.headers.get("Content-Type", NDJSON_MEDIA_TYPE)
+    content_type = content_type.split(";")[0].strip()
+    if content_type == NDJSON_MEDIA_TYPE:
+        entries = iter_ndjson_entries(request.stream())
+    elif content_type in ARCHIVE_MEDIA_TYPES:
+        entries = iter_archive_entries(request.stream(), content_type)
+    else:
+        raise UnsupportedImportFormat
+
+    imported, conflicts = await import_scripts(session, project_id, entries)
+    await session.commit()
+
+    return ScriptImportResultSchema(imported=imported, conflicts=conflicts)
+
+
+@bulk_router.get(
+    "/projects/{project_id}/scripts/export", response_class=StreamingResponse
+)
+async def export_project_scripts(
+    project_id: Annotated[int, Depends(get_owned_project_id)],
+    session_maker: Annotated[async_sessionmaker, Depends(get_read_session_maker)],
+) -> StreamingResponse:
+    return StreamingResponse(
+        export_scripts(session_maker, project_id), media_type=NDJSON_MEDIA_TYPE
+    )
@@ -0,0 +1,70 @@
+from functools import lru_cache
+from typing import Annotated, AsyncIterator
+
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from config import get_settings
+from database import get_session, is_foreign_key_violation
+from dataloader import EngineDataLoaders
+from scripts.exceptions import not_found
+from scripts.models import ProjectModel
+from users.dependencies import get_user_from_access_token
+from users.schemas import UserSchema
+
+
+async def get_project_owners(
+    project_ids: list[int], session: AsyncSession
+) -> dict[int, int]:
+    result = await session.execute(
+        select(ProjectModel.id, ProjectModel.owner_id).where(
+            ProjectModel.id.in_(project_ids)
+        )
+    )
+    return dict(result.all())
+
+
+project_owner_loaders = EngineDataLoaders(get_project_owners)
+
+
+async def check_project_owner(
+    session: AsyncSession, project_id: int, user_id: int
+) -> None:
+    owner_id = await project_owner_loaders.for_session(session).load(project_id)
+    if owner_id != user_id:
+        raise not_found("Project")
+
+
+@lru_cache
+def get_ownership_cache() -> TTLCache:
+    settings = get_settings().projects
+    return TTLCache(
+        maxsize=settings.ownership_cache_size,
+        ttl=settings.ownership_cache_ttl_seconds,
+    )
+
+
+async def get_owned_project_id(
+    project_id: int,
+    user: Annotated[UserSchema, Depends(get_user_from_access_token)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+    ownership_cache: Annotated[TTLCache, Depends(get_ownership_cache)],
+) -> AsyncIterator[int]:
+    # Only confirmed ownership is cached: owners never change, and a cached
+    # miss could hide a project created moments later.
+    key = (user.id, project_id)
+    if ownership_cache.get(key) is None:
+        await check_project_owner(session, project_id, user.id)
+        ownership_cache.set(key, True)
+    try:
+        yield project_id
+    except IntegrityError as exc:
+        # The entry can outlive a project deleted through another worker; the
+        # foreign key then rejects the route's writes.
+        if not is_foreign_key_violation(exc):
+            raise
+        ownership_cache.pop(key)
+        raise not_found("Project") from exc
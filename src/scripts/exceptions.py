@@ -10,3 +10,38 @@ def already_exist(subject: str) -> HTTPException:
 
 def not_found(subject: str) -> HTTPException:
     return HTTPException(status_code=404, detail=f"{subject} not found")
+
+
+def range_not_satisfiable(size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        detail="Requested range not satisfiable",
+        headers={"Content-Range": f"bytes */{size}"},
+    )
+
+
+def invalid_import_entry(location: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Invalid import entry: {location}",
+    )
+
+
+def import_too_large(location: str, limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Import too large: {location} exceeds {limit} bytes",
+    )
+
+
+UnsupportedImportFormat = HTTPException(
+    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+    detail="Expected application/x-ndjson, application/x-tar, "
+    "application/gzip or application/zip",
+)
+
+
+SourceNotUtf8 = HTTPException(
+    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    detail="Source is not UTF-8",
+)
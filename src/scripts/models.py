@@ -1,6 +1,6 @@
 from typing import List
 
-from sqlalchemy import ForeignKey, String, UniqueConstraint
+from sqlalchemy import ForeignKey, Index, LargeBinary, String, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from database import Base
@@ -10,6 +10,7 @@ class ProjectModel(Base):
     __tablename__ = "projects"
     __table_args__ = (
         UniqueConstraint("owner_id", "name", name="uq_owner_project_name"),
+        Index("ix_projects_owner_id_id", "owner_id", "id", postgresql_include=["name"]),
     )
 
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -17,19 +18,54 @@ class ProjectModel(Base):
     owner_id: Mapped[int] = mapped_column(
         ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
+    version: Mapped[int] = mapped_column(nullable=False)
 
-    scripts: Mapped[List["ScriptModel"]] = relationship()
+    scripts: Mapped[List["ScriptModel"]] = relationship(passive_deletes=True)
+
+    __mapper_args__ = {"version_id_col": version}
 
 
 class ScriptModel(Base):
     __tablename__ = "scripts"
     __table_args__ = (
         UniqueConstraint("parent_project_id", "path", name="uq_project_script_path"),
+        Index(
+            "ix_scripts_parent_project_id_id",
+            "parent_project_id",
+            "id",
+            postgresql_include=["path"],
+        ),
     )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     path: Mapped[str] = mapped_column(String(255), nullable=False)
-    source_code: Mapped[str] = mapped_column(nullable=False)
+    blob_hash: Mapped[str] = mapped_column(
+        ForeignKey("blobs.hash", name="fk_scripts_blob_hash_blobs"),
+        nullable=False,
+        index=True,
+    )
+    size: Mapped[int] = mapped_column(default=0)
     parent_project_id: Mapped[int] = mapped_column(
         ForeignKey("projects.id", ondelete="CASCADE"), nullable=False
     )
+    version: Mapped[int] = mapped_column(nullable=False)
+
+    __mapper_args__ = {"version_id_col": version}
+
+
+class BlobModel(Base):
+    __tablename__ = "blobs"
+
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size: Mapped[int] = mapped_column(nullable=False)
+    ref_count: Mapped[int] = mapped_column(default=0)
+
+
+class BlobChunkModel(Base):
+    __tablename__ = "blob_chunks"
+
+    blob_hash: Mapped[str] = mapped_column(
+        ForeignKey("blobs.hash", ondelete="CASCADE"), primary_key=True
+    )
+    seq: Mapped[int] = mapped_column(primary_key=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
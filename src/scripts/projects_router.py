@@ -1,14 +1,22 @@
 from typing import Annotated, List
 
-from fastapi import APIRouter, Depends
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy import delete, select, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_session
+from cache import TTLCache
+from database import get_read_session, get_session
+from etags import if_match_versions, is_not_modified, not_modified, version_etag
+from exceptions import PreconditionFailed
+from pagination import PageParams, finish_page, get_page_params, paginate
+from query_budget import query_budget
+from responses import schema_response
+from scripts.dependencies import get_ownership_cache
 from scripts.exceptions import already_exist, not_found
 from scripts.models import ProjectModel
 from scripts.schemas import ProjectInfoSchema, ProjectSchema
+from scripts.storage import delete_unreferenced_blobs, release_project_blobs
 from users.dependencies import get_user_from_access_token
 from users.schemas import UserSchema
 
@@ -16,7 +24,21 @@ from users.schemas import UserSchema
 projects_router = APIRouter(tags=["projects"])
 
 
+def project_etag(project: ProjectModel) -> str:
+    return version_etag("project", project.id, project.version)
+
+
+async def project_exists(session: AsyncSession, project_id: int, user_id: int) -> bool:
+    result = await session.execute(
+        select(ProjectModel.id).where(
+            ProjectModel.id == project_id, ProjectModel.owner_id == user_id
+        )
+    )
+    return result.scalar_one_or_none() is not None
+
+
 @projects_router.post("/projects/", response_model=ProjectInfoSchema)
+@query_budget(3)
 async def create_project(
     project: ProjectSchema,
     user: Annotated[UserSchema, Depends(get_user_from_access_token)],
@@ -33,26 +55,36 @@ async def create_project(
         await session.rollback()
         raise already_exist("Project") from exc
 
-    return new_project
+    return schema_response(ProjectInfoSchema, new_project)
 
 
 @projects_router.get("/projects/", response_model=List[ProjectInfoSchema])
+@query_budget(2)
 async def get_projects(
+    response: Response,
+    page: Annotated[PageParams, Depends(get_page_params)],
     user: Annotated[UserSchema, Depends(get_user_from_access_token)],
-    session: Annotated[AsyncSession, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
 ) -> List[ProjectInfoSchema]:
     result = await session.execute(
-        select(ProjectModel).where(ProjectModel.owner_id == user.id)
+        paginate(
+            select(ProjectModel).where(ProjectModel.owner_id == user.id),
+            ProjectModel.id,
+            page,
+        )
     )
-    projects = result.scalars().all()
-    return projects
+    projects = finish_page(result.scalars().all(), page, response)
+    return schema_response(List[ProjectInfoSchema], projects, response)
 
 
 @projects_router.get("/projects/{project_id}", response_model=ProjectInfoSchema)
+@query_budget(2)
 async def get_project(
     project_id: int,
+    request: Request,
+    response: Response,
     user: Annotated[UserSchema, Depends(get_user_from_access_token)],
-    session: Annotated[AsyncSession, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
 ) -> ProjectInfoSchema:
     result = await session.execute(
         select(ProjectModel).where(
@@ -62,51 +94,75 @@ async def get_project(
     project = result.scalar_one_or_none()
     if project is None:
         raise not_found("Project")
-    return project
+
+    etag = project_etag(project)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return schema_response(ProjectInfoSchema, project, response)
 
 
 @projects_router.put("/projects/{project_id}", response_model=ProjectInfoSchema)
+@query_budget(3)
 async def update_project(
     project_id: int,
     updated_project: ProjectSchema,
+    request: Request,
+    response: Response,
     user: Annotated[UserSchema, Depends(get_user_from_access_token)],
     session: Annotated[AsyncSession, Depends(get_session)],
+    ownership_cache: Annotated[TTLCache, Depends(get_ownership_cache)],
 ) -> ProjectInfoSchema:
-    result = await session.execute(
-        select(ProjectModel).where(
-            ProjectModel.id == project_id, ProjectModel.owner_id == user.id
-        )
+    statement = (
+        update(ProjectModel)
+        .where(ProjectModel.id == project_id, ProjectModel.owner_id == user.id)
+        .values(name=updated_project.name, version=ProjectModel.version + 1)
+        .returning(ProjectModel)
+        .execution_options(synchronize_session=False)
     )
-    project = result.scalar_one_or_none()
-    if project is None:
-        raise not_found("Project")
-
-    project.name = updated_project.name
+    versions = if_match_versions(request, "project", project_id)
+    if versions is not None:
+        statement = statement.where(ProjectModel.version.in_(versions))
 
     try:
-        await session.commit()
-        await session.refresh(project)
+        project = (await session.execute(statement)).scalar_one_or_none()
     except IntegrityError as exc:
         await session.rollback()
         raise already_exist("Project") from exc
 
-    return project
+    if project is None:
+        await session.rollback()
+        if versions is not None and await project_exists(session, project_id, user.id):
+            raise PreconditionFailed
+        raise not_found("Project")
+
+    await session.commit()
+    ownership_cache.pop((user.id, project_id))
+    response.headers["ETag"] = project_etag(project)
+    return schema_response(ProjectInfoSchema, project, response)
 
 
 @projects_router.delete("/projects/{project_id}", status_code=204)
+@query_budget(4)
 async def delete_project(
     project_id: int,
     user: Annotated[UserSchema, Depends(get_user_from_access_token)],
     session: Annotated[AsyncSession, Depends(get_session)],
+    ownership_cache: Annotated[TTLCache, Depends(get_ownership_cache)],
 ) -> None:
-    result = await session.execute(
-        select(ProjectModel).where(
-            ProjectModel.id == project_id, ProjectModel.owner_id == user.id
-        )
+    # Locking the project row first makes concurrent script inserts wait on
+    # their foreign key check, so the scripts counted when releasing blobs are
+    # exactly the ones the cascade deletes.
+    locked_project_id = await session.scalar(
+        select(ProjectModel.id)
+        .where(ProjectModel.id == project_id, ProjectModel.owner_id == user.id)
+        .with_for_update()
     )
-    project = result.scalar_one_or_none()
-    if project is None:
+    if locked_project_id is None:
         raise not_found("Project")
 
-    await session.delete(project)
+    unreferenced_blobs = await release_project_blobs(session, project_id, user.id)
+    await session.execute(delete(ProjectModel).where(ProjectModel.id == project_id))
+    await delete_unreferenced_blobs(session, unreferenced_blobs)
     await session.commit()
+    ownership_cache.pop((user.id, project_id))
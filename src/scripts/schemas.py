@@ -1,6 +1,6 @@
 from typing import Annotated
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ScriptSchema(BaseModel):
@@ -21,6 +21,7 @@ class ScriptSchema(BaseModel):
 
 class ScriptInfoSchema(ScriptSchema):
     id: int
+    size: int
     parent_project_id: int
 
     model_config = {
@@ -30,6 +31,7 @@ class ScriptInfoSchema(ScriptSchema):
                     "id": 1,
                     "path": "scripts/hello_world.py",
                     "source_code": "print('Hello, World!')",
+                    "size": 22,
                     "parent_project_id": 42,
                 }
             ]
@@ -37,6 +39,54 @@ class ScriptInfoSchema(ScriptSchema):
     }
 
 
+class ScriptMetaSchema(BaseModel):
+    id: int
+    path: Annotated[str, Field(max_length=255)]
+    size: int
+    parent_project_id: int
+
+    # pylint: disable-next=duplicate-code
+    model_config = ConfigDict(
+        from_attributes=True,
+        json_schema_extra={
+            "examples": [
+                {
+                    "id": 1,
+                    "path": "scripts/hello_world.py",
+                    "size": 22,
+                    "parent_project_id": 42,
+                }
+            ]
+        },
+    )
+
+
+class ScriptImportConflictSchema(BaseModel):
+    path: str
+    detail: str
+
+
+class ScriptImportResultSchema(BaseModel):
+    imported: int
+    conflicts: list[ScriptImportConflictSchema]
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "imported": 2,
+                    "conflicts": [
+                        {
+                            "path": "scripts/hello_world.py",
+                            "detail": "Script with this path already exists",
+                        }
+                    ],
+                }
+            ]
+        }
+    }
+
+
 class ProjectSchema(BaseModel):
     name: Annotated[str, Field(max_length=255)]
 
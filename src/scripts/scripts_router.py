@@ -1,148 +1,338 @@
 from typing import Annotated, List
 
-from fastapi import APIRouter, Depends
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, select, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from database import get_session
+from database import (
+    get_read_session,
+    get_read_session_maker,
+    get_session,
+    is_foreign_key_violation,
+)
+from etags import (
+    if_match_versions,
+    is_not_modified,
+    make_etag,
+    not_modified,
+    version_etag,
+)
+from exceptions import PreconditionFailed
+from pagination import (
+    NEXT_CURSOR_HEADER,
+    PageParams,
+    finish_page,
+    get_page_params,
+    paginate,
+)
+from query_budget import query_budget
+from responses import schema_response
+from scripts.dependencies import get_owned_project_id
 from scripts.exceptions import already_exist, not_found
-from scripts.models import ProjectModel, ScriptModel
-from scripts.schemas import ScriptInfoSchema, ScriptSchema
-from users.dependencies import get_user_from_access_token
-from users.schemas import UserSchema
+from scripts.models import ScriptModel
+from scripts.schemas import ScriptInfoSchema, ScriptMetaSchema, ScriptSchema
+from scripts.storage import (
+    delete_unreferenced_blobs,
+    iter_source,
+    parse_range,
+    read_source_code,
+    read_source_codes,
+    release_blob,
+    release_script_blob,
+    store_source,
+    store_source_code,
+    validate_utf8,
+)
 
 
 scripts_router = APIRouter(tags=["scripts"])
 
 
-@scripts_router.post("/projects/{project_id}/scripts", response_model=ScriptInfoSchema)
-async def create_project(
-    project_id: int,
-    script: ScriptSchema,
-    user: Annotated[UserSchema, Depends(get_user_from_access_token)],
-    session: Annotated[AsyncSession, Depends(get_session)],
-) -> ScriptInfoSchema:
+def script_etag(script: ScriptModel) -> str:
+    return version_etag("script", script.id, script.version)
+
+
+def to_script_info(script: ScriptModel, source_code: str) -> ScriptInfoSchema:
+    return ScriptInfoSchema(
+        id=script.id,
+        path=script.path,
+        size=script.size,
+        parent_project_id=script.parent_project_id,
+        source_code=source_code,
+    )
+
 
+async def get_project_script(
+    session: AsyncSession, project_id: int, script_id: int
+) -> ScriptModel:
     result = await session.execute(
-        select(ProjectModel).where(
-            ProjectModel.id == project_id, ProjectModel.owner_id == user.id
+        select(ScriptModel).where(
+            ScriptModel.id == script_id, ScriptModel.parent_project_id == project_id
         )
     )
-    if result is None:
-        raise not_found("Project")
+    script = result.scalar_one_or_none()
+    if script is None:
+        raise not_found("Script")
+    return script
 
-    new_script: ScriptModel = ScriptModel(
-        source_code=script.source_code, path=script.path, parent_project_id=project_id
+
+async def check_script_writable(
+    session: AsyncSession, request: Request, project_id: int, script_id: int
+) -> None:
+    # Runs before the new source is stored, so a missing script or a stale
+    # If-Match fails fast instead of after the whole body has been written.
+    # replace_script_source repeats both checks under the row lock.
+    script = await get_project_script(session, project_id, script_id)
+    versions = if_match_versions(request, "script", script_id)
+    if versions is not None and script.version not in versions:
+        raise PreconditionFailed
+
+
+async def replace_script_source(
+    session: AsyncSession,
+    request: Request,
+    project_id: int,
+    script_id: int,
+    **values,
+) -> ScriptModel:
+    # Releasing the old blob locks the script row and doubles as the existence
+    # and If-Match check, so the script itself needs a single UPDATE.
+    current_blob_hash = (
+        select(ScriptModel.blob_hash)
+        .where(ScriptModel.id == script_id, ScriptModel.parent_project_id == project_id)
+        .with_for_update(of=ScriptModel)
     )
-    session.add(new_script)
+    versions = if_match_versions(request, "script", script_id)
+    if versions is not None:
+        current_blob_hash = current_blob_hash.where(ScriptModel.version.in_(versions))
+
+    released = await release_script_blob(session, current_blob_hash)
+    if released is None:
+        await session.rollback()
+        if versions is not None:
+            await get_project_script(session, project_id, script_id)
+            raise PreconditionFailed
+        raise not_found("Script")
+
+    script = await session.scalar(
+        update(ScriptModel)
+        .where(ScriptModel.id == script_id)
+        .values(**values, version=ScriptModel.version + 1)
+        .returning(ScriptModel)
+        .execution_options(synchronize_session=False)
+    )
+    old_blob_hash, ref_count = released
+    if ref_count == 0:
+        await delete_unreferenced_blobs(session, [old_blob_hash])
+    return script
+
+
+@scripts_router.post("/projects/{project_id}/scripts", response_model=ScriptInfoSchema)
+@query_budget(5)
+async def create_project(
+    project_id: Annotated[int, Depends(get_owned_project_id)],
+    script: ScriptSchema,
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> ScriptInfoSchema:
 
     try:
+        blob_hash, size = await store_source_code(session, script.source_code)
+        new_script: ScriptModel = ScriptModel(
+            path=script.path,
+            blob_hash=blob_hash,
+            size=size,
+            parent_project_id=project_id,
+        )
+        session.add(new_script)
         await session.commit()
-        await session.refresh(new_script)
     except IntegrityError as exc:
         await session.rollback()
+        if is_foreign_key_violation(exc):
+            raise
         raise already_exist("Script") from exc
 
-    return new_script
+    return schema_response(
+        ScriptInfoSchema, to_script_info(new_script, script.source_code)
+    )
 
 
 @scripts_router.get(
-    "/projects/{project_id}/scripts", response_model=List[ScriptInfoSchema]
+    "/projects/{project_id}/scripts",
+    response_model=List[ScriptInfoSchema] | List[ScriptMetaSchema],
 )
+@query_budget(4)
 async def get_scripts(
-    project_id: int,
-    user: Annotated[UserSchema, Depends(get_user_from_access_token)],
-    session: Annotated[AsyncSession, Depends(get_session)],
-) -> List[ScriptInfoSchema]:
-    result = await session.execute(
-        select(ScriptModel)
-        .join(ProjectModel, ProjectModel.id == ScriptModel.parent_project_id)
-        .where(ProjectModel.id == project_id, ProjectModel.owner_id == user.id)
+    request: Request,
+    response: Response,
+    page: Annotated[PageParams, Depends(get_page_params)],
+    project_id: Annotated[int, Depends(get_owned_project_id)],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
+    include_source: bool = False,
+) -> List[ScriptInfoSchema] | List[ScriptMetaSchema]:
+    statement = select(ScriptModel).where(ScriptModel.parent_project_id == project_id)
+    result = await session.execute(paginate(statement, ScriptModel.id, page))
+    scripts = finish_page(result.scalars().all(), page, response)
+
+    etag = make_etag(
+        "scripts",
+        include_source,
+        response.headers.get(NEXT_CURSOR_HEADER),
+        *((script.id, script.version) for script in scripts),
+    )
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
+    if not include_source:
+        return schema_response(List[ScriptMetaSchema], scripts, response)
+
+    sources = await read_source_codes(session, {script.blob_hash for script in scripts})
+    return schema_response(
+        List[ScriptInfoSchema],
+        [to_script_info(script, sources[script.blob_hash]) for script in scripts],
+        response,
     )
-    scripts = result.scalars().all()
-    return scripts
 
 
 @scripts_router.get(
     "/projects/{project_id}/scripts/{script_id}", response_model=ScriptInfoSchema
 )
+@query_budget(4)
 async def get_script(
-    project_id: int,
+    project_id: Annotated[int, Depends(get_owned_project_id)],
     script_id: int,
-    user: Annotated[UserSchema, Depends(get_user_from_access_token)],
-    session: Annotated[AsyncSession, Depends(get_session)],
+    request: Request,
+    response: Response,
+    session: Annotated[AsyncSession, Depends(get_read_session)],
 ) -> ScriptInfoSchema:
-    result = await session.execute(
-        select(ScriptModel)
-        .join(ProjectModel, ProjectModel.id == ScriptModel.parent_project_id)
-        .where(
-            ScriptModel.id == script_id,
-            ProjectModel.id == project_id,
-            ProjectModel.owner_id == user.id,
-        )
+    script = await get_project_script(session, project_id, script_id)
+
+    etag = script_etag(script)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    source_code = await read_source_code(session, script.blob_hash)
+    return schema_response(
+        ScriptInfoSchema, to_script_info(script, source_code), response
     )
-    script = result.scalar_one_or_none()
-    if script is None:
-        raise not_found("Script")
-    return script
 
 
 @scripts_router.put(
     "/projects/{project_id}/scripts/{script_id}", response_model=ScriptInfoSchema
 )
+@query_budget(7)
 async def update_script(
-    project_id: int,
+    project_id: Annotated[int, Depends(get_owned_project_id)],
     script_id: int,
     updated_script: ScriptSchema,
-    user: Annotated[UserSchema, Depends(get_user_from_access_token)],
+    request: Request,
+    response: Response,
     session: Annotated[AsyncSession, Depends(get_session)],
 ) -> ScriptInfoSchema:
-    result = await session.execute(
-        select(ScriptModel)
-        .join(ProjectModel, ProjectModel.id == ScriptModel.parent_project_id)
-        .where(
-            ScriptModel.id == script_id,
-            ProjectModel.id == project_id,
-            ProjectModel.owner_id == user.id,
-        )
-    )
-    script = result.scalar_one_or_none()
-    if script is None:
-        raise not_found("Script")
-
-    script.path = updated_script.path
-    script.source_code = updated_script.source_code
-
+    await check_script_writable(session, request, project_id, script_id)
     try:
-        await session.commit()
-        await session.refresh(script)
+        blob_hash, size = await store_source_code(session, updated_script.source_code)
+        script = await replace_script_source(
+            session,
+            request,
+            project_id,
+            script_id,
+            path=updated_script.path,
+            blob_hash=blob_hash,
+            size=size,
+        )
     except IntegrityError as exc:
         await session.rollback()
         raise already_exist("Script") from exc
+    await session.commit()
 
-    return script
+    response.headers["ETag"] = script_etag(script)
+    return schema_response(
+        ScriptInfoSchema, to_script_info(script, updated_script.source_code), response
+    )
 
 
 @scripts_router.delete("/projects/{project_id}/scripts/{script_id}", status_code=204)
+@query_budget(5)
 async def delete_script(
-    project_id: int,
+    project_id: Annotated[int, Depends(get_owned_project_id)],
     script_id: int,
-    user: Annotated[UserSchema, Depends(get_user_from_access_token)],
     session: Annotated[AsyncSession, Depends(get_session)],
 ) -> None:
-    result = await session.execute(
-        select(ScriptModel)
-        .join(ProjectModel, ProjectModel.id == ScriptModel.parent_project_id)
-        .where(
-            ScriptModel.id == script_id,
-            ProjectModel.id == project_id,
-            ProjectModel.owner_id == user.id,
-        )
+    blob_hash = await session.scalar(
+        delete(ScriptModel)
+        .where(ScriptModel.id == script_id, ScriptModel.parent_project_id == project_id)
+        .returning(ScriptModel.blob_hash)
     )
-    script = result.scalar_one_or_none()
-    if script is None:
+    if blob_hash is None:
+        await session.rollback()
         raise not_found("Script")
 
-    await session.delete(script)
+    await release_blob(session, blob_hash)
     await session.commit()
+
+
+@scripts_router.put(
+    "/projects/{project_id}/scripts/{script_id}/source",
+    response_model=ScriptMetaSchema,
+)
+@query_budget(repeated_statements=True)
+async def upload_script_source(
+    project_id: Annotated[int, Depends(get_owned_project_id)],
+    script_id: int,
+    request: Request,
+    response: Response,
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> ScriptMetaSchema:
+    await check_script_writable(session, request, project_id, script_id)
+    blob_hash, size = await store_source(session, validate_utf8(request.stream()))
+    script = await replace_script_source(
+        session,
+        request,
+        project_id,
+        script_id,
+        blob_hash=blob_hash,
+        size=size,
+    )
+    await session.commit()
+
+    response.headers["ETag"] = script_etag(script)
+    return schema_response(ScriptMetaSchema, script, response)
+
+
+@scripts_router.get(
+    "/projects/{project_id}/scripts/{script_id}/source",
+    response_class=StreamingResponse,
+)
+@query_budget(3)
+async def download_script_source(
+    project_id: Annotated[int, Depends(get_owned_project_id)],
+    script_id: int,
+    request: Request,
+    session: Annotated[AsyncSession, Depends(get_read_session)],
+    session_maker: Annotated[async_sessionmaker, Depends(get_read_session_maker)],
+) -> StreamingResponse:
+    script = await get_project_script(session, project_id, script_id)
+    etag = f'"{script.blob_hash}"'
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+
+    headers = {"Accept-Ranges": "bytes", "ETag": etag}
+    status_code = status.HTTP_200_OK
+    start, end = 0, script.size - 1
+
+    byte_range = parse_range(request.headers.get("Range"), script.size)
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{script.size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        iter_source(session_maker, script.blob_hash, start, end),
+        status_code=status_code,
+        headers=headers,
+        media_type="text/plain; charset=utf-8",
+    )
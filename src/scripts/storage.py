@@ -0,0 +1,229 @@
+import codecs
+import hashlib
+import uuid
+from typing import AsyncIterable, AsyncIterator, Iterable
+
+from sqlalchemy import Row, Select, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database import dialect_insert
+from scripts.exceptions import SourceNotUtf8, range_not_satisfiable
+from scripts.models import BlobChunkModel, BlobModel, ProjectModel, ScriptModel
+
+
+SOURCE_CHUNK_SIZE = 64 * 1024
+
+
+def split_chunks(data: bytes) -> list[bytes]:
+    return [
+        data[offset : offset + SOURCE_CHUNK_SIZE]
+        for offset in range(0, len(data), SOURCE_CHUNK_SIZE)
+    ]
+
+
+async def rechunk(stream: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    buffer = bytearray()
+    async for data in stream:
+        buffer.extend(data)
+        while len(buffer) >= SOURCE_CHUNK_SIZE:
+            yield bytes(buffer[:SOURCE_CHUNK_SIZE])
+            del buffer[:SOURCE_CHUNK_SIZE]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def validate_utf8(stream: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    # Sources are inlined into JSON responses, so bytes that are not UTF-8
+    # are rejected while streaming instead of breaking every later read.
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        async for data in stream:
+            decoder.decode(data)
+            yield data
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError as exc:
+        raise SourceNotUtf8 from exc
+
+
+async def acquire_blob(session: AsyncSession, blob_hash: str, size: int) -> bool:
+    statement = dialect_insert(session, BlobModel).values(
+        hash=blob_hash, size=size, ref_count=1
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[BlobModel.hash],
+        set_={"ref_count": BlobModel.__table__.c.ref_count + 1},
+    ).returning(BlobModel.ref_count)
+    ref_count = await session.scalar(statement)
+    return ref_count == 1
+
+
+async def release_blob(session: AsyncSession, blob_hash: str) -> None:
+    ref_count = await session.scalar(
+        update(BlobModel)
+        .where(BlobModel.hash == blob_hash)
+        .values(ref_count=BlobModel.ref_count - 1)
+        .returning(BlobModel.ref_count)
+    )
+    if ref_count == 0:
+        await session.execute(
+            delete(BlobModel).where(
+                BlobModel.hash == blob_hash, BlobModel.ref_count == 0
+            )
+        )
+
+
+async def release_project_blobs(
+    session: AsyncSession, project_id: int, owner_id: int
+) -> list[str]:
+    references = (
+        select(func.count())  # pylint: disable=not-callable
+        .where(
+            ScriptModel.parent_project_id == project_id,
+            ScriptModel.blob_hash == BlobModel.hash,
+        )
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        update(BlobModel)
+        .where(
+            BlobModel.hash.in_(
+                select(ScriptModel.blob_hash)
+                .join(ProjectModel, ProjectModel.id == ScriptModel.parent_project_id)
+                .where(ProjectModel.id == project_id, ProjectModel.owner_id == owner_id)
+            )
+        )
+        .values(ref_count=BlobModel.ref_count - references)
+        .returning(BlobModel.hash, BlobModel.ref_count)
+    )
+    return [blob_hash for blob_hash, ref_count in result if ref_count == 0]
+
+
+async def release_script_blob(
+    session: AsyncSession, script_blob_hash: Select
+) -> Row[tuple[str, int]] | None:
+    result = await session.execute(
+        update(BlobModel)
+        .where(BlobModel.hash == script_blob_hash.scalar_subquery())
+        .values(ref_count=BlobModel.ref_count - 1)
+        .returning(BlobModel.hash, BlobModel.ref_count)
+    )
+    return result.one_or_none()
+
+
+async def delete_unreferenced_blobs(
+    session: AsyncSession, blob_hashes: list[str]
+) -> None:
+    if blob_hashes:
+        await session.execute(
+            delete(BlobModel).where(
+                BlobModel.hash.in_(blob_hashes), BlobModel.ref_count == 0
+            )
+        )
+
+
+async def store_source_code(session: AsyncSession, source_code: str) -> tuple[str, int]:
+    data = source_code.encode("utf-8")
+    blob_hash = hashlib.sha256(data).hexdigest()
+    if await acquire_blob(session, blob_hash, len(data)):
+        chunks = split_chunks(data)
+        if chunks:
+            await session.execute(
+                insert(BlobChunkModel),
+                [
+                    {"blob_hash": blob_hash, "seq": seq, "data": chunk}
+                    for seq, chunk in enumerate(chunks)
+                ],
+            )
+    return blob_hash, len(data)
+
+
+async def store_source(
+    session: AsyncSession, stream: AsyncIterable[bytes]
+) -> tuple[str, int]:
+    staging_hash = f"staging-{uuid.uuid4().hex}"
+    session.add(BlobModel(hash=staging_hash, size=0, ref_count=0))
+    await session.flush()
+
+    digest = hashlib.sha256()
+    size = 0
+    seq = 0
+    async for chunk in rechunk(stream):
+        await session.execute(
+            insert(BlobChunkModel).values(blob_hash=staging_hash, seq=seq, data=chunk)
+        )
+        digest.update(chunk)
+        size += len(chunk)
+        seq += 1
+
+    blob_hash = digest.hexdigest()
+    if await acquire_blob(session, blob_hash, size):
+        await session.execute(
+            update(BlobChunkModel)
+            .where(BlobChunkModel.blob_hash == staging_hash)
+            .values(blob_hash=blob_hash)
+        )
+    await session.execute(delete(BlobModel).where(BlobModel.hash == staging_hash))
+    return blob_hash, size
+
+
+async def read_source_codes(
+    session: AsyncSession, blob_hashes: Iterable[str]
+) -> dict[str, str]:
+    sources = {blob_hash: bytearray() for blob_hash in blob_hashes}
+    if not sources:
+        return {}
+    result = await session.execute(
+        select(BlobChunkModel.blob_hash, BlobChunkModel.data)
+        .where(BlobChunkModel.blob_hash.in_(sources))
+        .order_by(BlobChunkModel.blob_hash, BlobChunkModel.seq)
+    )
+    for blob_hash, data in result:
+        sources[blob_hash].extend(data)
+    return {blob_hash: data.decode("utf-8") for blob_hash, data in sources.items()}
+
+
+async def read_source_code(session: AsyncSession, blob_hash: str) -> str:
+    return (await read_source_codes(session, [blob_hash]))[blob_hash]
+
+
+async def iter_source(
+    session_maker: async_sessionmaker, blob_hash: str, start: int, end: int
+) -> AsyncIterator[bytes]:
+    first_seq = start // SOURCE_CHUNK_SIZE
+    last_seq = end // SOURCE_CHUNK_SIZE
+    async with session_maker() as session:
+        for seq in range(first_seq, last_seq + 1):
+            data = await session.scalar(
+                select(BlobChunkModel.data).where(
+                    BlobChunkModel.blob_hash == blob_hash,
+                    BlobChunkModel.seq == seq,
+                )
+            )
+            offset = seq * SOURCE_CHUNK_SIZE
+            expected = min(end - offset + 1, SOURCE_CHUNK_SIZE)
+            # Content-Length is already sent, so a short read has to abort the
+            # connection instead of ending a truncated 200/206.
+            if data is None or len(data) < expected:
+                raise RuntimeError(f"Blob {blob_hash} is missing chunk {seq}")
+            yield data[max(start - offset, 0) : end - offset + 1]
+
+
+def parse_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    if range_header is None:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise range_not_satisfiable(size)
+    return start, min(end, size - 1)
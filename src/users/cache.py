@@ -0,0 +1,60 @@
+import time
+from functools import lru_cache
+
+from cache import TTLCache
+from config import Settings, get_settings
+from users.schemas import TokenPayloadSchema, UserSchema
+
+
+class TokenCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize, ttl)
+        self._users = TTLCache(maxsize, ttl)
+        self._invalidated_at = TTLCache(maxsize, ttl)
+
+    def get(self, token: str) -> tuple[TokenPayloadSchema, UserSchema] | None:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        cached_at, payload, user = entry
+        if cached_at <= self._invalidated_at.get(user.id, 0.0):
+            self._entries.pop(token)
+            return None
+        return payload, user
+
+    def get_user(self, user_id: int) -> UserSchema | None:
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        cached_at, user = entry
+        if cached_at <= self._invalidated_at.get(user_id, 0.0):
+            self._users.pop(user_id)
+            return None
+        return user
+
+    def set(self, token: str, payload: TokenPayloadSchema, user: UserSchema) -> None:
+        now = time.monotonic()
+        self._entries.set(token, (now, payload, user), ttl=payload.exp - time.time())
+        self._users.set(user.id, (now, user))
+
+    def invalidate_user(self, user_id: int) -> None:
+        self._invalidated_at.set(user_id, time.monotonic())
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._users.clear()
+        self._invalidated_at.clear()
+
+
+def token_cache_enabled(settings: Settings) -> bool:
+    return (
+        settings.server.workers == 1 or settings.auth_jwt.token_version_backend == "kv"
+    )
+
+
+@lru_cache
+def get_token_cache() -> TokenCache:
+    settings = get_settings()
+    return TokenCache(
+        settings.auth_jwt.token_cache_size, settings.auth_jwt.token_cache_ttl_seconds
+    )
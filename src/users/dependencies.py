@@ -1,15 +1,18 @@
 from functools import lru_cache
 from typing import Annotated, Callable
 
-from fastapi import Depends
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jwt.exceptions import DecodeError, ExpiredSignatureError
+from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
 from pydantic import ValidationError
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import Settings, get_settings
 from database import get_session
+from dataloader import EngineDataLoaders
+from rate_limit import SlidingWindowRateLimiter, get_rate_limiter
+from users.cache import TokenCache, get_token_cache, token_cache_enabled
 from users.exceptions import (
     InvalidCredentials,
     InvalidToken,
@@ -18,7 +21,14 @@ from users.exceptions import (
     TokenRevoked,
     Usernot_found,
 )
+from users.hashing import PasswordHasher, get_password_hasher
+from users.keys import get_key_ring
 from users.models import UserModel
+from users.revocation import (
+    NullTokenVersionStore,
+    TokenVersionStore,
+    get_token_version_store,
+)
 from users.schemas import (
     RefreshTokenSchema,
     TokenPayloadSchema,
@@ -26,37 +36,181 @@ from users.schemas import (
     UserAuthSchema,
     UserSchema,
 )
-from users.utils import decode_jwt, validate_password
+from users.utils import decode_jwt
 
 
 http_bearer = HTTPBearer()
 
 
 class TokenValidator:
-    def __init__(self, expected_token_type: TokenType | None = None):
+    def __init__(
+        self,
+        expected_token_type: TokenType | None = None,
+        token_cache: TokenCache | None = None,
+        token_version_store: TokenVersionStore | None = None,
+    ):
         self.expected_token_type = expected_token_type
+        self.token_cache = token_cache
+        self.token_version_store = token_version_store or NullTokenVersionStore()
 
     async def __call__(
         self, token: str, session: AsyncSession, settings: Settings
     ) -> UserSchema:
+        _, user = await self.resolve(token, session, settings)
+        return user
+
+    async def resolve(
+        self, token: str, session: AsyncSession, settings: Settings
+    ) -> tuple[TokenPayloadSchema, UserSchema]:
+        cached = await self.get_cached(token)
+        if cached is not None:
+            return cached
+
+        token_payload = self.decode(token, settings)
+        user = await self.get_known_user(token_payload.id)
+        if user is None:
+            user = await get_user_from_db(token_payload.id, session)
+            await self.token_version_store.remember_version(user.id, user.token_version)
+        return self.accept(token, token_payload, user)
+
+    async def resolve_many(
+        self, tokens: list[str], session: AsyncSession, settings: Settings
+    ) -> list[tuple[TokenPayloadSchema, UserSchema] | HTTPException]:
+        # The version store is read with one batched call and written with one
+        # pipelined call, however many tokens and users the batch holds.
+        results: dict[str, tuple[TokenPayloadSchema, UserSchema] | HTTPException] = {}
+        cached_entries: dict[str, tuple[TokenPayloadSchema, UserSchema]] = {}
+        pending: dict[str, TokenPayloadSchema] = {}
+        for token in dict.fromkeys(tokens):
+            try:
+                cached = self.get_cache_entry(token)
+                if cached is not None:
+                    cached_entries[token] = cached
+                else:
+                    pending[token] = self.decode(token, settings)
+            except HTTPException as exc:
+                results[token] = exc
+
+        pending_user_ids = list({payload.id for payload in pending.values()})
+        versions = await self.token_version_store.get_versions(
+            list(
+                {user.id for _, user in cached_entries.values()}.union(pending_user_ids)
+            )
+        )
+        for token, cached in cached_entries.items():
+            try:
+                results[token] = self.check_cached(cached, versions[cached[1].id])
+            except HTTPException as exc:
+                results[token] = exc
+
+        users_by_id = await self.load_users(pending_user_ids, versions, session)
+        for token, token_payload in pending.items():
+            try:
+                user = users_by_id[token_payload.id]
+                if user is None:
+                    raise Usernot_found
+                results[token] = self.accept(token, token_payload, user)
+            except HTTPException as exc:
+                results[token] = exc
+        return [results[token] for token in tokens]
+
+    async def load_users(
+        self,
+        user_ids: list[int],
+        versions: dict[int, int | None],
+        session: AsyncSession,
+    ) -> dict[int, UserSchema | None]:
+        users_by_id = {
+            user_id: self.match_known_user(user_id, versions[user_id])
+            for user_id in user_ids
+        }
+        missing_ids = [user_id for user_id, user in users_by_id.items() if user is None]
+        users = await user_loaders.for_session(session).load_many(missing_ids)
+        loaded_versions = {}
+        for user_id, user in zip(missing_ids, users):
+            users_by_id[user_id] = user
+            if user is not None:
+                loaded_versions[user_id] = user.token_version
+        await self.token_version_store.remember_versions(loaded_versions)
+        return users_by_id
+
+    async def get_cached(
+        self, token: str
+    ) -> tuple[TokenPayloadSchema, UserSchema] | None:
+        cached = self.get_cache_entry(token)
+        if cached is None:
+            return None
+        current_version = await self.token_version_store.get_version(cached[1].id)
+        return self.check_cached(cached, current_version)
+
+    def get_cache_entry(
+        self, token: str
+    ) -> tuple[TokenPayloadSchema, UserSchema] | None:
+        if self.token_cache is None:
+            return None
+        cached = self.token_cache.get(token)
+        if cached is not None:
+            self.check_token_type(cached[0])
+        return cached
+
+    def check_cached(
+        self,
+        cached: tuple[TokenPayloadSchema, UserSchema],
+        current_version: int | None,
+    ) -> tuple[TokenPayloadSchema, UserSchema]:
+        token_payload, user = cached
+        if current_version not in (None, token_payload.token_version):
+            self.token_cache.invalidate_user(user.id)
+            raise TokenRevoked
+        return cached
+
+    async def get_known_user(self, user_id: int) -> UserSchema | None:
+        if self.token_cache is None or self.token_cache.get_user(user_id) is None:
+            return None
+        current_version = await self.token_version_store.get_version(user_id)
+        return self.match_known_user(user_id, current_version)
+
+    def match_known_user(
+        self, user_id: int, current_version: int | None
+    ) -> UserSchema | None:
+        # A user already resolved under another token is reused when the shared
+        # version store confirms its token_version, skipping the users query.
+        # The default null store never confirms, so that query always runs.
+        if self.token_cache is None:
+            return None
+        user = self.token_cache.get_user(user_id)
+        if user is None or user.token_version != current_version:
+            return None
+        return user
+
+    def decode(self, token: str, settings: Settings) -> TokenPayloadSchema:
         token_payload = validate_token_payload(token, settings)
+        self.check_token_type(token_payload)
+        return token_payload
+
+    def accept(
+        self, token: str, token_payload: TokenPayloadSchema, user: UserSchema
+    ) -> tuple[TokenPayloadSchema, UserSchema]:
+        if user.token_version != token_payload.token_version:
+            raise TokenRevoked
+        if self.token_cache is not None:
+            self.token_cache.set(token, token_payload, user)
+        return token_payload, user
 
+    def check_token_type(self, token_payload: TokenPayloadSchema) -> None:
         if (
             self.expected_token_type is not None
             and token_payload.token_type != self.expected_token_type
         ):
             raise InvalidTokenType
 
-        user_from_db = await get_user_from_db(token_payload.id, session)
-        if user_from_db.token_version != token_payload.token_version:
-            raise TokenRevoked
-
-        return user_from_db
-
 
 @lru_cache
 def get_token_validator(expected_token_type: TokenType | None = None) -> TokenValidator:
-    return TokenValidator(expected_token_type)
+    # Other workers would keep accepting a revoked token from their own cache,
+    # so without a shared version store every token is checked against the DB.
+    token_cache = get_token_cache() if token_cache_enabled(get_settings()) else None
+    return TokenValidator(expected_token_type, token_cache, get_token_version_store())
 
 
 async def get_access_token_from_header(
@@ -109,29 +263,66 @@ async def get_user_from_refresh_token(
     return user
 
 
+async def get_users_from_db(
+    user_ids: list[int], session: AsyncSession
+) -> dict[int, UserSchema]:
+    result = await session.execute(select(UserModel).where(UserModel.id.in_(user_ids)))
+    return {user.id: UserSchema.model_validate(user) for user in result.scalars()}
+
+
+user_loaders = EngineDataLoaders(get_users_from_db)
+
+
 async def get_user_from_db(user_id: int, session: AsyncSession) -> UserSchema:
-    result = await session.execute(select(UserModel).where(UserModel.id == user_id))
-    user = result.scalar_one_or_none()
+    user = await user_loaders.for_session(session).load(user_id)
     if not user:
         raise Usernot_found
-    return UserSchema.model_validate(user)
+    return user
 
 
 def validate_token_payload(token: str, settings: Settings) -> TokenPayloadSchema:
     try:
-        raw_payload = decode_jwt(
-            token, settings.auth_jwt.secret_key, settings.auth_jwt.algorithm
-        )
+        raw_payload = decode_jwt(token, get_key_ring(settings))
         token_payload: TokenPayloadSchema = TokenPayloadSchema(**raw_payload)
         return token_payload
-    except (DecodeError, ValidationError) as exc:
-        raise InvalidToken from exc
     except ExpiredSignatureError as exc:
         raise TokenExpired from exc
+    except (InvalidTokenError, ValidationError) as exc:
+        raise InvalidToken from exc
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+async def limit_login_attempts(
+    request: Request,
+    user_creds: UserAuthSchema,
+    limiter: Annotated[SlidingWindowRateLimiter, Depends(get_rate_limiter)],
+    settings: Annotated[Settings, Depends(get_settings)],
+) -> None:
+    rate_limit = settings.rate_limit
+    if rate_limit.rate_limit_enabled:
+        await limiter.hit(f"login:ip:{client_ip(request)}", rate_limit.login_ip_limit)
+        await limiter.hit(f"login:user:{user_creds.login}", rate_limit.login_user_limit)
+
+
+async def limit_registrations(
+    request: Request,
+    limiter: Annotated[SlidingWindowRateLimiter, Depends(get_rate_limiter)],
+    settings: Annotated[Settings, Depends(get_settings)],
+) -> None:
+    rate_limit = settings.rate_limit
+    if rate_limit.rate_limit_enabled:
+        await limiter.hit(
+            f"register:ip:{client_ip(request)}", rate_limit.register_ip_limit
+        )
 
 
 async def get_user_from_credentials(
-    user_creds: UserAuthSchema, session: Annotated[AsyncSession, Depends(get_session)]
+    user_creds: UserAuthSchema,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    hasher: Annotated[PasswordHasher, Depends(get_password_hasher)],
 ) -> UserSchema:
     result = await session.execute(
         select(UserModel).where(UserModel.login == user_creds.login)
@@ -139,6 +330,6 @@ async def get_user_from_credentials(
     user_in_db = result.scalar_one_or_none()
     if user_in_db is None:
         raise InvalidCredentials
-    if not validate_password(user_creds.password, user_in_db.password):
+    if not await hasher.verify(user_creds.password, user_in_db.password):
         raise InvalidCredentials
     return user_in_db
@@ -25,3 +25,9 @@ TokenExpired = HTTPException(
 UserAlreadExits = HTTPException(
     status_code=status.HTTP_409_CONFLICT, detail="User with this login already exists"
 )
+
+PasswordHashingBusy = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Server is busy, try again later",
+    headers={"Retry-After": "1"},
+)
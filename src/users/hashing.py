@@ -0,0 +1,50 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, TypeVar
+
+from config import get_settings
+from metrics import PASSWORD_HASHING_DURATION
+from users.exceptions import PasswordHashingBusy
+from users.utils import hash_password, validate_password
+
+
+T = TypeVar("T")
+
+
+class PasswordHasher:
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bcrypt"
+        )
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run("verify", validate_password, password, hashed_password)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, operation: str, func: Callable[..., T], *args) -> T:
+        if self._pending >= self.max_pending:
+            raise PasswordHashingBusy
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            timed = PASSWORD_HASHING_DURATION.labels(operation).time()(func)
+            return await loop.run_in_executor(self._executor, timed, *args)
+        finally:
+            self._pending -= 1
+
+
+@lru_cache
+def get_password_hasher() -> PasswordHasher:
+    settings = get_settings()
+    return PasswordHasher(
+        settings.password_hashing.bcrypt_workers,
+        settings.password_hashing.bcrypt_max_pending,
+    )
@@ -0,0 +1,89 @@
+import json
+from functools import cached_property, lru_cache
+from pathlib import Path
+from typing import Any
+
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+from jwt.algorithms import ECAlgorithm, OKPAlgorithm, RSAAlgorithm
+from jwt.exceptions import DecodeError
+
+from config import AuthJWT, Settings
+
+
+EC_ALGORITHMS = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}
+
+
+class SigningKey:
+    def __init__(
+        self, kid: str | None, algorithm: str, private_key: Any, public_key: Any
+    ):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.private_key = private_key
+        self.public_key = public_key
+
+    def to_jwk(self) -> dict[str, Any]:
+        if self.algorithm == "RS256":
+            jwk_algorithm = RSAAlgorithm
+        elif self.algorithm in EC_ALGORITHMS.values():
+            jwk_algorithm = ECAlgorithm
+        else:
+            jwk_algorithm = OKPAlgorithm
+        jwk = jwk_algorithm.to_jwk(self.public_key, as_dict=True)
+        return {**jwk, "kid": self.kid, "alg": self.algorithm, "use": "sig"}
+
+
+class KeyRing:
+    def __init__(self, keys: list[SigningKey], active_kid: str | None = None):
+        self.keys = {key.kid: key for key in keys}
+        if active_kid and active_kid not in self.keys:
+            available = ", ".join(sorted(kid for kid in self.keys if kid))
+            raise ValueError(
+                f"ACTIVE_KID {active_kid!r} has no signing key; available: {available}"
+            )
+        self.signing_key = self.keys[active_kid] if active_kid else keys[-1]
+
+    def verification_key(self, kid: str | None) -> SigningKey:
+        key = self.keys.get(kid)
+        if key is None:
+            raise DecodeError(f"Unknown key id: {kid}")
+        return key
+
+    @cached_property
+    def jwks(self) -> bytes:
+        public_keys = [key.to_jwk() for key in self.keys.values() if key.kid]
+        return json.dumps({"keys": public_keys}, separators=(",", ":")).encode()
+
+
+def load_signing_key(path: Path) -> SigningKey:
+    private_key = load_pem_private_key(path.read_bytes(), password=None)
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        algorithm = "RS256"
+    elif isinstance(private_key, ed25519.Ed25519PrivateKey):
+        algorithm = "EdDSA"
+    elif isinstance(private_key, ec.EllipticCurvePrivateKey):
+        algorithm = EC_ALGORITHMS.get(private_key.curve.name)
+        if algorithm is None:
+            raise ValueError(
+                f"Unsupported elliptic curve {private_key.curve.name} in {path}"
+            )
+    else:
+        raise ValueError(f"Unsupported signing key type in {path}")
+    return SigningKey(path.stem, algorithm, private_key, private_key.public_key())
+
+
+def load_key_ring(auth_jwt: AuthJWT) -> KeyRing:
+    if auth_jwt.keys_dir is None:
+        secret = auth_jwt.secret_key
+        return KeyRing([SigningKey(None, auth_jwt.algorithm, secret, secret)])
+
+    paths = sorted(Path(auth_jwt.keys_dir).glob("*.pem"))
+    if not paths:
+        raise ValueError(f"No *.pem signing keys found in {auth_jwt.keys_dir}")
+    return KeyRing([load_signing_key(path) for path in paths], auth_jwt.active_kid)
+
+
+@lru_cache
+def get_key_ring(settings: Settings) -> KeyRing:
+    return load_key_ring(settings.auth_jwt)
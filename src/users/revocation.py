@@ -0,0 +1,80 @@
+from functools import lru_cache
+from typing import Protocol
+
+from config import get_settings
+from kv import KeyValueClient, get_kv_client
+
+
+class TokenVersionStore(Protocol):
+    async def get_version(self, user_id: int) -> int | None: ...
+
+    async def set_version(self, user_id: int, version: int) -> None: ...
+
+    async def remember_version(self, user_id: int, version: int) -> None: ...
+
+    async def get_versions(self, user_ids: list[int]) -> dict[int, int | None]: ...
+
+    async def remember_versions(self, versions: dict[int, int]) -> None: ...
+
+
+class NullTokenVersionStore:
+    # Default backend: no shared store, token_version is always read from the
+    # users table.
+    async def get_version(self, user_id: int) -> int | None:
+        return None
+
+    async def set_version(self, user_id: int, version: int) -> None:
+        return None
+
+    async def remember_version(self, user_id: int, version: int) -> None:
+        return None
+
+    async def get_versions(self, user_ids: list[int]) -> dict[int, int | None]:
+        return dict.fromkeys(user_ids)
+
+    async def remember_versions(self, versions: dict[int, int]) -> None:
+        return None
+
+
+class KeyValueTokenVersionStore:
+    def __init__(self, client: KeyValueClient, prefix: str = "token_version:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get_version(self, user_id: int) -> int | None:
+        value = await self.client.get(f"{self.prefix}{user_id}")
+        return None if value is None else int(value)
+
+    async def set_version(self, user_id: int, version: int) -> None:
+        await self.client.set(f"{self.prefix}{user_id}", version)
+
+    async def remember_version(self, user_id: int, version: int) -> None:
+        # Seeds the store from a DB read. NX keeps a concurrent revocation's
+        # newer value from being overwritten by this possibly older one.
+        await self.client.set(f"{self.prefix}{user_id}", version, nx=True)
+
+    async def get_versions(self, user_ids: list[int]) -> dict[int, int | None]:
+        if not user_ids:
+            return {}
+        values = await self.client.mget(
+            [f"{self.prefix}{user_id}" for user_id in user_ids]
+        )
+        return {
+            user_id: None if value is None else int(value)
+            for user_id, value in zip(user_ids, values)
+        }
+
+    async def remember_versions(self, versions: dict[int, int]) -> None:
+        if not versions:
+            return
+        pipeline = self.client.pipeline(transaction=False)
+        for user_id, version in versions.items():
+            pipeline.set(f"{self.prefix}{user_id}", version, nx=True)
+        await pipeline.execute()
+
+
+@lru_cache
+def get_token_version_store() -> TokenVersionStore:
+    if get_settings().auth_jwt.token_version_backend == "kv":
+        return KeyValueTokenVersionStore(get_kv_client())
+    return NullTokenVersionStore()
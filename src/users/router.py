@@ -1,41 +1,64 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Path
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Request,
+    Response,
+)
 from sqlalchemy import update
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import Settings, get_settings
 from database import get_session
+from etags import is_not_modified, make_etag, not_modified
 from exceptions import DatabaseError, SelfActionRequired
+from ledger.operations import post_transaction
+from ledger.schemas import TransactionKind
+from query_budget import query_budget
+from responses import schema_response
+from users.cache import TokenCache, get_token_cache
 from users.dependencies import (
     get_token_validator,
     get_user_from_access_token,
     get_user_from_credentials,
     get_user_from_refresh_token,
-    validate_token_payload,
+    limit_login_attempts,
+    limit_registrations,
 )
 from users.exceptions import UserAlreadExits
+from users.hashing import PasswordHasher, get_password_hasher
+from users.keys import get_key_ring
 from users.models import UserModel
+from users.revocation import TokenVersionStore, get_token_version_store
 from users.schemas import (
     AddMoneySchema,
+    TokenBatchSchema,
     TokenObtainPairSchema,
     TokenSchema,
+    TokenVerificationSchema,
     UserAuthSchema,
     UserInfoResponseSchema,
     UserSchema,
 )
-from users.utils import create_access_token, create_refresh_token, hash_password
+from users.utils import create_access_token, create_refresh_token
 
 
 users_router = APIRouter(tags=["users"])
 
 
-@users_router.post("/register")
+@users_router.post("/register", dependencies=[Depends(limit_registrations)])
+@query_budget(2)
 async def register_user_jwt(
-    user: UserAuthSchema, session: Annotated[AsyncSession, Depends(get_session)]
+    user: UserAuthSchema,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    hasher: Annotated[PasswordHasher, Depends(get_password_hasher)],
 ) -> UserInfoResponseSchema:
-    hashed_password = hash_password(user.password)
+    hashed_password = await hasher.hash(user.password)
     new_user: UserModel = UserModel(login=user.login, password=hashed_password)
     session.add(new_user)
 
@@ -46,10 +69,11 @@ async def register_user_jwt(
         await session.rollback()
         raise UserAlreadExits from exc
 
-    return new_user
+    return schema_response(UserInfoResponseSchema, new_user)
 
 
-@users_router.post("/token")
+@users_router.post("/token", dependencies=[Depends(limit_login_attempts)])
+@query_budget(1)
 async def get_user_token(
     user: Annotated[UserSchema, Depends(get_user_from_credentials)],
     settings: Annotated[Settings, Depends(get_settings)],
@@ -63,13 +87,42 @@ async def get_user_token(
 
 
 @users_router.get("/users/me")
+@query_budget(1)
 async def get_user_info(
+    request: Request,
+    response: Response,
     current_user: Annotated[UserSchema, Depends(get_user_from_access_token)],
 ) -> UserInfoResponseSchema:
-    return current_user
+    etag = make_etag(
+        "user", current_user.id, current_user.login, current_user.money_balance
+    )
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return schema_response(UserInfoResponseSchema, current_user, response)
+
+
+@users_router.get("/.well-known/jwks.json")
+async def get_jwks(
+    request: Request,
+    settings: Annotated[Settings, Depends(get_settings)],
+) -> Response:
+    key_ring = get_key_ring(settings)
+    etag = make_etag("jwks", key_ring.jwks)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    return Response(
+        content=key_ring.jwks,
+        media_type="application/json",
+        headers={
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={settings.auth_jwt.jwks_max_age_seconds}",
+        },
+    )
 
 
 @users_router.post("/token/refresh")
+@query_budget(1)
 async def refresh_tokens(
     user: Annotated[UserSchema, Depends(get_user_from_refresh_token)],
     settings: Annotated[Settings, Depends(get_settings)],
@@ -83,15 +136,14 @@ async def refresh_tokens(
 
 
 @users_router.post("/token/verify")
+@query_budget(1)
 async def verify_token(
     payload: TokenSchema,
     session: Annotated[AsyncSession, Depends(get_session)],
     settings: Annotated[Settings, Depends(get_settings)],
 ):
-    token = payload.token
     validator = get_token_validator()
-    token_payload = validate_token_payload(token, settings)
-    user = await validator(token=token, session=session, settings=settings)
+    token_payload, user = await validator.resolve(payload.token, session, settings)
     return {
         "detail": "Token is valid",
         "user_id": user.id,
@@ -99,44 +151,69 @@ async def verify_token(
     }
 
 
+@users_router.post("/token/verify/batch")
+@query_budget(1)
+async def verify_tokens(
+    payload: TokenBatchSchema,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    settings: Annotated[Settings, Depends(get_settings)],
+) -> list[TokenVerificationSchema]:
+    validator = get_token_validator()
+    results = await validator.resolve_many(payload.tokens, session, settings)
+    return [
+        (
+            TokenVerificationSchema(valid=False, detail=result.detail)
+            if isinstance(result, HTTPException)
+            else TokenVerificationSchema(
+                valid=True, user_id=result[1].id, token_type=result[0].token_type
+            )
+        )
+        for result in results
+    ]
+
+
 @users_router.post("/users/{user_id}/revoke_tokens")
+@query_budget(2)
 async def revoke_user_tokens(
     user_id: Annotated[int, Path(title="id of current user")],
     user: Annotated[UserSchema, Depends(get_user_from_access_token)],
     session: Annotated[AsyncSession, Depends(get_session)],
+    token_cache: Annotated[TokenCache, Depends(get_token_cache)],
+    token_version_store: Annotated[TokenVersionStore, Depends(get_token_version_store)],
 ):
     if user_id != user.id:
         raise SelfActionRequired
     try:
-        await session.execute(
+        result = await session.execute(
             update(UserModel)
             .values(token_version=UserModel.token_version + 1)
             .where(UserModel.id == user_id)
+            .returning(UserModel.token_version)
         )
+        token_version = result.scalar_one()
         await session.commit()
     except SQLAlchemyError as exc:
         await session.rollback()
         raise DatabaseError from exc
+    await token_version_store.set_version(user_id, token_version)
+    token_cache.invalidate_user(user_id)
     return {"detail": "Tokens revoked"}
 
 
 @users_router.post("/users/{user_id}/add_money")
+@query_budget(5)
 async def add_money(
     user_id: Annotated[int, Path(title="id of current user")],
     money_schema: AddMoneySchema,
     user: Annotated[UserSchema, Depends(get_user_from_access_token)],
     session: Annotated[AsyncSession, Depends(get_session)],
+    token_cache: Annotated[TokenCache, Depends(get_token_cache)],
+    idempotency_key: Annotated[str | None, Header(max_length=255)] = None,
 ):
     if user_id != user.id:
         raise SelfActionRequired
-    try:
-        await session.execute(
-            update(UserModel)
-            .values(money_balance=UserModel.money_balance + money_schema.amount)
-            .where(UserModel.id == user_id)
-        )
-        await session.commit()
-    except SQLAlchemyError as exc:
-        await session.rollback()
-        raise DatabaseError from exc
+    await post_transaction(
+        session, user_id, TransactionKind.CREDIT, money_schema.amount, idempotency_key
+    )
+    token_cache.invalidate_user(user_id)
     return {"detail": "Money added"}
@@ -110,6 +110,39 @@ class TokenSchema(BaseModel):
     }
 
 
+class TokenBatchSchema(BaseModel):
+    tokens: Annotated[list[str], Field(min_length=1, max_length=1000)]
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "tokens": [
+                        "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9...",
+                        "eyJhbGciOiJFZERTQSIsImtpZCI6IjIwMjYifQ...",
+                    ]
+                }
+            ]
+        }
+    }
+
+
+class TokenVerificationSchema(BaseModel):
+    valid: bool
+    user_id: int | None = None
+    token_type: TokenType | None = None
+    detail: str | None = None
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {"valid": True, "user_id": 1, "token_type": "access"},
+                {"valid": False, "detail": "Token expired"},
+            ]
+        }
+    }
+
+
 class AddMoneySchema(BaseModel):
     amount: Annotated[Decimal, Field(gt=0, decimal_places=10, max_digits=30)]
 
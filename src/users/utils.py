@@ -5,12 +5,13 @@ import bcrypt
 import jwt
 
 from config import Settings
+from metrics import JWT_DURATION
+from users.keys import KeyRing, SigningKey, get_key_ring
 
 
 def encode_jwt(
     payload: dict[str, Any],
-    key: str,
-    algorithm: str,
+    key: SigningKey,
     expire_time_delta: int | None = None,
 ) -> str:
     to_encode = payload.copy()
@@ -18,7 +19,9 @@ def encode_jwt(
         to_encode["exp"] = datetime.now(timezone.utc) + timedelta(
             minutes=expire_time_delta
         )
-    encoded = jwt.encode(to_encode, key, algorithm)
+    headers = {"kid": key.kid} if key.kid else None
+    with JWT_DURATION.labels("encode").time():
+        encoded = jwt.encode(to_encode, key.private_key, key.algorithm, headers=headers)
     return encoded
 
 
@@ -31,8 +34,7 @@ def create_access_token(user_id: int, user_token_version: int, settings: Setting
     return encode_jwt(
         token_payload,
         expire_time_delta=settings.auth_jwt.access_token_expire_minutes,
-        algorithm=settings.auth_jwt.algorithm,
-        key=settings.auth_jwt.secret_key,
+        key=get_key_ring(settings).signing_key,
     )
 
 
@@ -45,17 +47,14 @@ def create_refresh_token(user_id: int, user_token_version: int, settings: Settin
     return encode_jwt(
         token_payload,
         expire_time_delta=settings.auth_jwt.refresh_token_expire_minutes,
-        algorithm=settings.auth_jwt.algorithm,
-        key=settings.auth_jwt.secret_key,
+        key=get_key_ring(settings).signing_key,
     )
 
 
-def decode_jwt(
-    token: str,
-    key: str,
-    algorithm: str,
-) -> Any:
-    decoded = jwt.decode(token, key, algorithms=[algorithm])
+def decode_jwt(token: str, key_ring: KeyRing) -> Any:
+    with JWT_DURATION.labels("decode").time():
+        key = key_ring.verification_key(jwt.get_unverified_header(token).get("kid"))
+        decoded = jwt.decode(token, key.public_key, algorithms=[key.algorithm])
     return decoded
 
 
@@ -0,0 +1,29 @@
+import jwt
+from jwt import PyJWKClient
+
+from users.schemas import TokenPayloadSchema, TokenType
+
+
+# Lets other services verify access tokens locally. Public keys from
+# /.well-known/jwks.json stay parsed in memory and an unknown kid triggers a
+# refetch, so key rotation needs no coordination. Fetching is synchronous:
+# async callers should warm the cache at startup or verify in a thread.
+class JwksVerifier:
+
+    def __init__(self, jwks_url: str, cache_ttl_seconds: int = 300):
+        self.client = PyJWKClient(
+            jwks_url, cache_keys=True, cache_jwk_set=True, lifespan=cache_ttl_seconds
+        )
+
+    def verify(
+        self, token: str, expected_token_type: TokenType = TokenType.ACCESS
+    ) -> TokenPayloadSchema:
+        signing_key = self.client.get_signing_key_from_jwt(token)
+        payload = TokenPayloadSchema(
+            **jwt.decode(
+                token, signing_key.key, algorithms=[signing_key.algorithm_name]
+            )
+        )
+        if payload.token_type != expected_token_type:
+            raise jwt.InvalidTokenError("Unexpected token type")
+        return payload
@@ -1 +1 @@
-from tests.fixtures.async_client import async_client
+from tests.fixtures.async_client import async_client, session_maker
@@ -2,27 +2,53 @@ from decimal import Decimal
 
 import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
-from database import get_session
+from config import get_settings
+from database import ReplicaSet, get_replica_set, get_session_maker
+from metrics import instrument_engine
+from rate_limit import get_rate_limiter
+from scripts.dependencies import get_ownership_cache
 from src.main import app
+from users.cache import get_token_cache
 from users.models import Base
 
 
+def enable_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
 @pytest_asyncio.fixture(scope="function")
-async def async_client():
+async def session_maker():
 
     test_engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    test_session_maker = async_sessionmaker(bind=test_engine)
+    event.listen(test_engine.sync_engine, "connect", enable_foreign_keys)
+    instrument_engine(test_engine)
 
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
-    async def override_get_session():
-        async with test_session_maker() as session:
-            yield session
+    yield async_sessionmaker(bind=test_engine, expire_on_commit=False)
+
+    await test_engine.dispose()
 
-    app.dependency_overrides[get_session] = override_get_session
+
+@pytest_asyncio.fixture(scope="function")
+async def async_client(session_maker, monkeypatch):
+    # Every request in the suite must stay within its route's query budget.
+    monkeypatch.setattr(get_settings().db, "db_query_budget_enforce", True)
+
+    async def override_get_session_maker():
+        return session_maker
+
+    app.dependency_overrides[get_session_maker] = override_get_session_maker
+    app.dependency_overrides[get_replica_set] = lambda: ReplicaSet([])
+    get_token_cache().clear()
+    get_ownership_cache().clear()
+    get_rate_limiter.cache_clear()
 
     async with AsyncClient(
         transport=ASGITransport(app=app), base_url="http://test"
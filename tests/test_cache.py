@@ -0,0 +1,56 @@
+import time
+
+from cache import TTLCache
+from users.cache import TokenCache
+from users.schemas import TokenPayloadSchema, TokenType, UserSchema
+
+
+def make_entry(user_id: int = 1, expires_in: int = 60):
+    payload = TokenPayloadSchema(
+        id=user_id,
+        token_version=0,
+        token_type=TokenType.ACCESS,
+        exp=int(time.time()) + expires_in,
+    )
+    user = UserSchema(
+        id=user_id, login="user", password="hash", money_balance=0, token_version=0
+    )
+    return payload, user
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1, ttl=0.01)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+
+
+def test_token_cache_ttl_is_capped_at_token_expiry():
+    cache = TokenCache(maxsize=10, ttl=60)
+    cache.set("expired", *make_entry(expires_in=-1))
+
+    assert cache.get("expired") is None
+
+
+def test_token_cache_invalidate_user():
+    cache = TokenCache(maxsize=10, ttl=60)
+    cache.set("token-1", *make_entry(user_id=1))
+    cache.set("token-2", *make_entry(user_id=2))
+
+    cache.invalidate_user(1)
+
+    assert cache.get("token-1") is None
+    assert cache.get("token-2") is not None
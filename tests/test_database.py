@@ -0,0 +1,77 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from config import get_settings
+from database import ReplicaSet, create_engine, get_replica_set
+from src.main import app
+from tests.fixtures import async_client
+from users.models import Base, UserModel
+
+
+def test_engine_pool_is_configured_from_settings():
+    settings = get_settings()
+    engine = create_engine(settings)
+
+    assert engine.pool.size() == settings.db.db_pool_size
+    assert engine.pool._max_overflow == settings.db.db_max_overflow
+    assert engine.pool._pre_ping is settings.db.db_pool_pre_ping
+
+
+@pytest_asyncio.fixture
+async def replica(async_client):
+    replica_engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    replicas = ReplicaSet([replica_engine])
+    app.dependency_overrides[get_replica_set] = lambda: replicas
+    yield replicas
+    for engine in replicas.engines:
+        await engine.dispose()
+
+
+async def copy_users_to_replica(session_maker, replicas):
+    async with session_maker() as session:
+        users = (await session.execute(select(UserModel))).scalars().all()
+    async with replicas.session_makers[0]() as session:
+        for user in users:
+            await session.merge(user)
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_reads_use_healthy_replica_until_client_writes(
+    async_client, session_maker, replica
+):
+    await async_client.post(
+        "/api/v1/register", json={"login": "testuser", "password": "testpass"}
+    )
+    login_response = await async_client.post(
+        "/api/v1/token", json={"login": "testuser", "password": "testpass"}
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+    await copy_users_to_replica(session_maker, replica)
+    await replica.check(timeout=1)
+
+    response = await async_client.post(
+        "/api/v1/projects/", json={"name": "project"}, headers=headers
+    )
+    assert "read_primary=1" in response.headers["set-cookie"]
+
+    response = await async_client.get("/api/v1/projects/", headers=headers)
+    assert [project["name"] for project in response.json()] == ["project"]
+
+    async_client.cookies.clear()
+    response = await async_client.get("/api/v1/projects/", headers=headers)
+    assert response.json() == []
+
+    response = await async_client.get("/api/v1/projects/", headers=headers)
+    assert "set-cookie" not in response.headers
+
+    await replica.engines[0].dispose()
+    replica.engines[0] = create_async_engine("sqlite+aiosqlite:////nonexistent/db")
+    await replica.check(timeout=1)
+    assert replica.choose() is None
+    response = await async_client.get("/api/v1/projects/", headers=headers)
+    assert [project["name"] for project in response.json()] == ["project"]
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from config import get_settings
+from dataloader import DataLoader, EngineDataLoaders
+
+
+@pytest.mark.asyncio
+async def test_loads_in_same_tick_share_one_batch():
+    batches = []
+
+    async def batch_load(keys):
+        batches.append(sorted(keys))
+        return {key: key * 10 for key in keys if key != 3}
+
+    loader = DataLoader(batch_load)
+    results = await asyncio.gather(
+        loader.load(1), loader.load(2), loader.load(1), loader.load(3)
+    )
+
+    assert results == [10, 20, 10, None]
+    assert batches == [[1, 2, 3]]
+
+    assert await loader.load_many([2, 4]) == [20, 40]
+    assert batches == [[1, 2, 3], [2, 4]]
+
+
+@pytest.mark.asyncio
+async def test_batch_failure_reaches_every_caller():
+    async def batch_load(keys):
+        raise RuntimeError("database unavailable")
+
+    loader = DataLoader(batch_load)
+    results = await asyncio.gather(
+        loader.load(1), loader.load(2), return_exceptions=True
+    )
+
+    assert [str(result) for result in results] == ["database unavailable"] * 2
+
+
+@pytest.mark.asyncio
+async def test_engine_batches_share_a_bounded_connection_limit(monkeypatch):
+    monkeypatch.setattr(get_settings().db, "db_dataloader_connections", 1)
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    running = []
+    overlaps = []
+
+    async def batch_load(keys, _session):
+        running.append(keys)
+        overlaps.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(keys)
+        return {key: key for key in keys}
+
+    users = EngineDataLoaders(batch_load)
+    owners = EngineDataLoaders(batch_load)
+    async with AsyncSession(engine) as session:
+        results = await asyncio.gather(
+            users.for_session(session).load(1), owners.for_session(session).load(2)
+        )
+
+    assert results == [1, 2]
+    assert overlaps == [1, 1]
+    await engine.dispose()
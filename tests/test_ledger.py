@@ -0,0 +1,179 @@
+from decimal import Decimal
+
+import pytest
+
+from config import get_settings
+
+
+async def register_and_login(async_client, login):
+    register_response = await async_client.post(
+        "/api/v1/register", json={"login": login, "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": login, "password": "pass"}
+    )
+    access_token = token_response.json()["access_token"]
+    return register_response.json()["id"], {"Authorization": f"Bearer {access_token}"}
+
+
+@pytest.mark.asyncio
+async def test_credit_is_idempotent(async_client):
+    user_id, headers = await register_and_login(async_client, "ledger1")
+
+    responses = [
+        await async_client.post(
+            f"/api/v1/users/{user_id}/credit",
+            json={"amount": "40.00"},
+            headers={**headers, "Idempotency-Key": "invoice-1"},
+        )
+        for _ in range(2)
+    ]
+    assert [response.status_code for response in responses] == [200, 200]
+    assert responses[0].json() == responses[1].json()
+    assert Decimal(responses[0].json()["balance_after"]) == Decimal("40")
+
+    response = await async_client.post(
+        f"/api/v1/users/{user_id}/add_money",
+        json={"amount": "10.00"},
+        headers={**headers, "Idempotency-Key": "invoice-1"},
+    )
+    assert response.status_code == 422
+
+    response = await async_client.get("/api/v1/users/me", headers=headers)
+    assert Decimal(response.json()["money_balance"]) == Decimal("40")
+
+
+@pytest.mark.asyncio
+async def test_debit_and_history(async_client):
+    user_id, headers = await register_and_login(async_client, "ledger2")
+
+    await async_client.post(
+        f"/api/v1/users/{user_id}/credit", json={"amount": "30.00"}, headers=headers
+    )
+    response = await async_client.post(
+        f"/api/v1/users/{user_id}/debit",
+        json={"amount": "50.00"},
+        headers=headers,
+    )
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Insufficient funds"
+
+    response = await async_client.post(
+        f"/api/v1/users/{user_id}/debit",
+        json={"amount": "12.50"},
+        headers={**headers, "Idempotency-Key": "charge-1"},
+    )
+    assert response.status_code == 200
+    assert response.json()["kind"] == "debit"
+    assert Decimal(response.json()["amount"]) == Decimal("-12.5")
+    assert Decimal(response.json()["balance_after"]) == Decimal("17.5")
+    assert b'"amount":-12.5,"balance_after":17.5,' in response.content
+
+    response = await async_client.get("/api/v1/users/me", headers=headers)
+    assert Decimal(response.json()["money_balance"]) == Decimal("17.5")
+
+    response = await async_client.get(
+        f"/api/v1/users/{user_id}/transactions", headers=headers
+    )
+    assert response.status_code == 200
+    assert [entry["kind"] for entry in response.json()] == ["credit", "debit"]
+    assert sum(Decimal(entry["amount"]) for entry in response.json()) == Decimal("17.5")
+
+
+@pytest.mark.asyncio
+async def test_batch_requires_service_token(async_client, monkeypatch):
+    monkeypatch.setattr(get_settings().service_auth, "service_token", "service-secret")
+    entries = [{"user_id": 1, "kind": "credit", "amount": "1", "idempotency_key": "k"}]
+
+    response = await async_client.post(
+        "/api/v1/internal/ledger/batch",
+        json={"entries": entries},
+        headers={"Authorization": "Bearer wrong-secret"},
+    )
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_batch_applies_entries(async_client, monkeypatch):
+    monkeypatch.setattr(get_settings().service_auth, "service_token", "service-secret")
+    service_headers = {"Authorization": "Bearer service-secret"}
+    first_id, first_headers = await register_and_login(async_client, "ledger3")
+    second_id, _ = await register_and_login(async_client, "ledger4")
+
+    await async_client.post(
+        f"/api/v1/users/{first_id}/credit",
+        json={"amount": "5.00"},
+        headers={**first_headers, "Idempotency-Key": "topup-1"},
+    )
+    response = await async_client.get("/api/v1/users/me", headers=first_headers)
+    assert Decimal(response.json()["money_balance"]) == Decimal("5")
+
+    entries = [
+        {
+            "user_id": first_id,
+            "kind": "credit",
+            "amount": "5",
+            "idempotency_key": "topup-1",
+        },
+        {
+            "user_id": first_id,
+            "kind": "debit",
+            "amount": "3",
+            "idempotency_key": "charge-1",
+        },
+        {
+            "user_id": first_id,
+            "kind": "debit",
+            "amount": "3",
+            "idempotency_key": "charge-2",
+        },
+        {
+            "user_id": first_id,
+            "kind": "debit",
+            "amount": "3",
+            "idempotency_key": "charge-1",
+        },
+        {
+            "user_id": second_id,
+            "kind": "credit",
+            "amount": "7",
+            "idempotency_key": "topup-1",
+        },
+        {
+            "user_id": second_id + 100,
+            "kind": "credit",
+            "amount": "1",
+            "idempotency_key": "x",
+        },
+    ]
+    response = await async_client.post(
+        "/api/v1/internal/ledger/batch",
+        json={"entries": entries},
+        headers=service_headers,
+    )
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["status"] for result in results] == [
+        "duplicate",
+        "applied",
+        "insufficient_funds",
+        "duplicate",
+        "applied",
+        "user_not_found",
+    ]
+    assert results[1]["transaction_id"] == results[3]["transaction_id"]
+    assert Decimal(results[1]["balance_after"]) == Decimal("2")
+    assert Decimal(results[4]["balance_after"]) == Decimal("7")
+
+    response = await async_client.get("/api/v1/users/me", headers=first_headers)
+    assert Decimal(response.json()["money_balance"]) == Decimal("2")
+
+    response = await async_client.post(
+        "/api/v1/internal/ledger/batch",
+        json={"entries": entries},
+        headers=service_headers,
+    )
+    assert [result["status"] for result in response.json()][1:3] == [
+        "duplicate",
+        "insufficient_funds",
+    ]
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from config import get_settings
+from database import create_engine
+from metrics import QueryStats, current_query_stats, instrument_engine
+
+
+def sample_value(metrics_text, name, labels):
+    for family in text_string_to_metric_families(metrics_text):
+        for sample in family.samples:
+            if sample.name == name and all(
+                sample.labels.get(key) == value for key, value in labels.items()
+            ):
+                return sample.value
+    return None
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_requests_db_and_crypto(
+    async_client, session_maker
+):
+    instrument_engine(session_maker.kw["bind"])
+    await async_client.post(
+        "/api/v1/register", json={"login": "metrics", "password": "pass"}
+    )
+    response = await async_client.post(
+        "/api/v1/token", json={"login": "metrics", "password": "pass"}
+    )
+    assert response.status_code == 200
+
+    response = await async_client.get("/api/v1/metrics")
+    assert response.status_code == 200
+    metrics_text = response.text
+
+    route_labels = {"method": "POST", "route": "/token"}
+    assert (
+        sample_value(
+            metrics_text, "http_requests_total", {**route_labels, "status": "200"}
+        )
+        >= 1
+    )
+    assert (
+        sample_value(metrics_text, "http_request_duration_seconds_count", route_labels)
+        >= 1
+    )
+    assert sample_value(metrics_text, "http_request_db_queries_sum", route_labels) >= 1
+    assert (
+        sample_value(
+            metrics_text,
+            "password_hashing_duration_seconds_count",
+            {"operation": "verify"},
+        )
+        >= 1
+    )
+    assert (
+        sample_value(
+            metrics_text, "jwt_duration_seconds_count", {"operation": "encode"}
+        )
+        >= 2
+    )
+
+
+@pytest.mark.asyncio
+async def test_pool_gauges_are_labelled_per_engine(async_client):
+    settings = get_settings()
+    primary = create_engine(settings)
+    replica = create_engine(settings)
+    instrument_engine(primary)
+    instrument_engine(replica, "replica-0")
+    await replica.dispose()
+    assert replica.pool.role == "replica-0"
+
+    primary.pool.checkedout = lambda: 3
+    replica.pool.checkedout = lambda: 1
+    primary.pool._update_gauges()
+    replica.pool._update_gauges()
+
+    response = await async_client.get("/api/v1/metrics")
+    metrics_text = response.text
+    assert (
+        sample_value(
+            metrics_text, "db_pool_checked_out_connections", {"engine": "primary"}
+        )
+        == 3
+    )
+    assert (
+        sample_value(
+            metrics_text, "db_pool_checked_out_connections", {"engine": "replica-0"}
+        )
+        == 1
+    )
+    await primary.dispose()
+    await replica.dispose()
+
+
+@pytest.mark.asyncio
+async def test_failed_statement_does_not_skew_the_next_duration():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    instrument_engine(engine)
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+            await conn.execute(text("INSERT INTO items VALUES (1)"))
+            with pytest.raises(IntegrityError):
+                await conn.execute(text("INSERT INTO items VALUES (1)"))
+            assert not (await conn.get_raw_connection()).info["query_start"]
+            assert stats.count == 3
+
+            await asyncio.sleep(0.2)
+            duration_before = stats.duration
+            await conn.execute(text("SELECT 1"))
+            assert stats.count == 4
+            assert stats.duration - duration_before < 0.1
+    finally:
+        current_query_stats.reset(token)
+        await engine.dispose()
@@ -0,0 +1,33 @@
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import Base, migrate
+
+
+def get_schema_diff(connection):
+    context = MigrationContext.configure(connection)
+    return compare_metadata(context, Base.metadata)
+
+
+def get_index_names(connection, table_name):
+    return {index["name"] for index in inspect(connection).get_indexes(table_name)}
+
+
+@pytest.mark.asyncio
+async def test_migrations_match_models():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    await migrate(engine)
+
+    async with engine.connect() as conn:
+        assert await conn.run_sync(get_schema_diff) == []
+        assert "ix_projects_owner_id_id" in await conn.run_sync(
+            get_index_names, "projects"
+        )
+        assert "ix_scripts_parent_project_id_id" in await conn.run_sync(
+            get_index_names, "scripts"
+        )
+
+    await engine.dispose()
@@ -1,4 +1,7 @@
 import pytest
+from sqlalchemy import select
+
+from scripts.models import BlobModel
 
 
 @pytest.mark.asyncio
@@ -129,3 +132,119 @@ async def test_delete_project(async_client):
         headers={"Authorization": f"Bearer {access_token}"},
     )
     assert get_response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_projects_paginated(async_client):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user6", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user6", "password": "pass"}
+    )
+    access_token = token_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    for name in ["Project One", "Project Two", "Project Three"]:
+        await async_client.post(
+            "/api/v1/projects/", json={"name": name}, headers=headers
+        )
+
+    response = await async_client.get(
+        "/api/v1/projects/", params={"limit": 2}, headers=headers
+    )
+    assert response.status_code == 200
+    assert [project["name"] for project in response.json()] == [
+        "Project One",
+        "Project Two",
+    ]
+
+    response = await async_client.get(
+        "/api/v1/projects/",
+        params={"limit": 2, "after": response.headers["X-Next-Cursor"]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert [project["name"] for project in response.json()] == ["Project Three"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_project_conditional_requests(async_client):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user7", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user7", "password": "pass"}
+    )
+    access_token = token_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    create_response = await async_client.post(
+        "/api/v1/projects/", json={"name": "Project Eta"}, headers=headers
+    )
+    project_url = f"/api/v1/projects/{create_response.json()['id']}"
+
+    response = await async_client.get(project_url, headers=headers)
+    etag = response.headers["ETag"]
+
+    response = await async_client.get(
+        project_url, headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    response = await async_client.put(
+        project_url,
+        json={"name": "Project Eta Updated"},
+        headers={**headers, "If-Match": '"stale"'},
+    )
+    assert response.status_code == 412
+
+    response = await async_client.put(
+        project_url,
+        json={"name": "Project Eta Updated"},
+        headers={**headers, "If-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_delete_project_releases_its_script_blobs(async_client, session_maker):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user24", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user24", "password": "pass"}
+    )
+    headers = {"Authorization": f"Bearer {token_response.json()['access_token']}"}
+    project_ids = []
+    for name in ["Project Psi", "Project Omega"]:
+        response = await async_client.post(
+            "/api/v1/projects/", json={"name": name}, headers=headers
+        )
+        project_ids.append(response.json()["id"])
+        for path in ["shared.py", "copy.py"]:
+            await async_client.post(
+                f"/api/v1/projects/{project_ids[-1]}/scripts",
+                json={"path": path, "source_code": "print('shared')"},
+                headers=headers,
+            )
+    await async_client.post(
+        f"/api/v1/projects/{project_ids[0]}/scripts",
+        json={"path": "own.py", "source_code": "print('own')"},
+        headers=headers,
+    )
+
+    response = await async_client.delete(
+        f"/api/v1/projects/{project_ids[0]}", headers=headers
+    )
+    assert response.status_code == 204
+    async with session_maker() as session:
+        blobs = (await session.execute(select(BlobModel))).scalars().all()
+    assert [blob.ref_count for blob in blobs] == [2]
+
+    response = await async_client.delete(
+        f"/api/v1/projects/{project_ids[0]}", headers=headers
+    )
+    assert response.status_code == 404
@@ -0,0 +1,46 @@
+import pytest
+
+from metrics import QueryStats
+from query_budget import QueryBudgetExceeded, find_violations
+from users.router import get_user_info
+
+
+async def login(async_client):
+    await async_client.post(
+        "/api/v1/register", json={"login": "testuser", "password": "testpass"}
+    )
+    response = await async_client.post(
+        "/api/v1/token", json={"login": "testuser", "password": "testpass"}
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_server_timing_reports_queries(async_client):
+    headers = await login(async_client)
+
+    response = await async_client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == 200
+    assert "db;dur=" in response.headers["Server-Timing"]
+    assert 'desc="1 queries"' in response.headers["Server-Timing"]
+
+
+@pytest.mark.asyncio
+async def test_route_over_query_budget_fails(async_client, monkeypatch):
+    headers = await login(async_client)
+    monkeypatch.setattr(get_user_info, "query_budget", 0)
+
+    with pytest.raises(QueryBudgetExceeded, match="1 queries, budget is 0"):
+        await async_client.get("/api/v1/users/me", headers=headers)
+
+
+def test_repeated_statement_is_reported_as_n_plus_one():
+    stats = QueryStats()
+    stats.count = 6
+    stats.statements["SELECT scripts.id FROM scripts\nWHERE scripts.id = ?"] = 5
+    stats.statements["SELECT users.id FROM users"] = 1
+    scope = {"method": "GET", "path": "/projects/1/scripts"}
+
+    assert find_violations(scope, stats) == [
+        "possible N+1, 5x: SELECT scripts.id FROM scripts WHERE scripts.id = ?"
+    ]
@@ -1,4 +1,13 @@
+import io
+import json
+import tarfile
+import zipfile
+
 import pytest
+from sqlalchemy import delete, event, select
+
+from config import get_settings
+from scripts.models import BlobChunkModel, BlobModel, ProjectModel
 
 
 @pytest.mark.asyncio
@@ -161,3 +170,609 @@ async def test_delete_script(async_client):
         f"/api/v1/projects/{project_id}/scripts/{script_id}", headers=headers
     )
     assert get_response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_get_scripts_paginated_without_source(async_client):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user9", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user9", "password": "pass"}
+    )
+    access_token = token_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    project_response = await async_client.post(
+        "/api/v1/projects/", json={"name": "Project Iota"}, headers=headers
+    )
+    project_id = project_response.json()["id"]
+
+    for index in range(3):
+        await async_client.post(
+            f"/api/v1/projects/{project_id}/scripts",
+            json={"path": f"script{index}.py", "source_code": f"print({index})"},
+            headers=headers,
+        )
+
+    response = await async_client.get(
+        f"/api/v1/projects/{project_id}/scripts",
+        params={"limit": 2},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [script["path"] for script in data] == ["script0.py", "script1.py"]
+    assert all("source_code" not in script for script in data)
+
+    response = await async_client.get(
+        f"/api/v1/projects/{project_id}/scripts",
+        params={
+            "limit": 2,
+            "after": response.headers["X-Next-Cursor"],
+            "include_source": True,
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [script["source_code"] for script in data] == ["print(2)"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_get_scripts_invalid_cursor(async_client):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user10", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user10", "password": "pass"}
+    )
+    access_token = token_response.json()["access_token"]
+
+    response = await async_client.get(
+        "/api/v1/projects/1/scripts",
+        params={"after": "not a cursor"},
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_upload_and_download_script_source(async_client):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user11", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user11", "password": "pass"}
+    )
+    access_token = token_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    project_response = await async_client.post(
+        "/api/v1/projects/", json={"name": "Project Kappa"}, headers=headers
+    )
+    project_id = project_response.json()["id"]
+    script_response = await async_client.post(
+        f"/api/v1/projects/{project_id}/scripts",
+        json={"path": "big.py", "source_code": ""},
+        headers=headers,
+    )
+    script_id = script_response.json()["id"]
+    source = ("print('ñ')\n" * 20000).encode("utf-8")
+
+    upload_response = await async_client.put(
+        f"/api/v1/projects/{project_id}/scripts/{script_id}/source",
+        content=source,
+        headers=headers,
+    )
+    assert upload_response.status_code == 200
+    assert upload_response.json()["size"] == len(source)
+
+    download_response = await async_client.get(
+        f"/api/v1/projects/{project_id}/scripts/{script_id}/source", headers=headers
+    )
+    assert download_response.status_code == 200
+    assert download_response.headers["Content-Length"] == str(len(source))
+    assert download_response.content == source
+
+    range_response = await async_client.get(
+        f"/api/v1/projects/{project_id}/scripts/{script_id}/source",
+        headers={**headers, "Range": "bytes=65530-65545"},
+    )
+    assert range_response.status_code == 206
+    assert range_response.headers["Content-Range"] == (
+        f"bytes 65530-65545/{len(source)}"
+    )
+    assert range_response.content == source[65530:65546]
+
+    script_response = await async_client.get(
+        f"/api/v1/projects/{project_id}/scripts/{script_id}", headers=headers
+    )
+    assert script_response.json()["source_code"] == source.decode("utf-8")
+
+    invalid_range_response = await async_client.get(
+        f"/api/v1/projects/{project_id}/scripts/{script_id}/source",
+        headers={**headers, "Range": f"bytes={len(source)}-"},
+    )
+    assert invalid_range_response.status_code == 416
+
+    upload_response = await async_client.put(
+        f"/api/v1/projects/{project_id}/scripts/{script_id}/source",
+        content=source + b"\xff",
+        headers=headers,
+    )
+    assert upload_response.status_code == 422
+    assert upload_response.json()["detail"] == "Source is not UTF-8"
+    script_response = await async_client.get(
+        f"/api/v1/projects/{project_id}/scripts/{script_id}", headers=headers
+    )
+    assert script_response.json()["source_code"] == source.decode("utf-8")
+
+
+@pytest.mark.asyncio
+async def test_download_with_missing_chunk_aborts(async_client, session_maker):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user11b", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user11b", "password": "pass"}
+    )
+    headers = {"Authorization": f"Bearer {token_response.json()['access_token']}"}
+    project_response = await async_client.post(
+        "/api/v1/projects/", json={"name": "Project Kappa B"}, headers=headers
+    )
+    project_id = project_response.json()["id"]
+    script_response = await async_client.post(
+        f"/api/v1/projects/{project_id}/scripts",
+        json={"path": "big.py", "source_code": "print('x')\n" * 20000},
+        headers=headers,
+    )
+    script_id = script_response.json()["id"]
+
+    async with session_maker() as session:
+        await session.execute(delete(BlobChunkModel).where(BlobChunkModel.seq == 1))
+        await session.commit()
+
+    with pytest.raises(RuntimeError, match="missing chunk 1"):
+        await async_client.get(
+            f"/api/v1/projects/{project_id}/scripts/{script_id}/source",
+            headers=headers,
+        )
+
+
+@pytest.mark.asyncio
+async def test_identical_sources_share_one_blob(async_client, session_maker):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user12", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user12", "password": "pass"}
+    )
+    access_token = token_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    script_ids = {}
+    for name in ["Project Lambda", "Project Mu"]:
+        project_response = await async_client.post(
+            "/api/v1/projects/", json={"name": name}, headers=headers
+        )
+        project_id = project_response.json()["id"]
+        script_response = await async_client.post(
+            f"/api/v1/projects/{project_id}/scripts",
+            json={"path": "shared.py", "source_code": "print('shared')"},
+            headers=headers,
+        )
+        script_ids[project_id] = script_response.json()["id"]
+
+    async with session_maker() as session:
+        blobs = (await session.execute(select(BlobModel))).scalars().all()
+    assert [blob.ref_count for blob in blobs] == [2]
+
+    first_project_id, second_project_id = script_ids
+    await async_client.delete(f"/api/v1/projects/{first_project_id}", headers=headers)
+    async with session_maker() as session:
+        blobs = (await session.execute(select(BlobModel))).scalars().all()
+    assert [blob.ref_count for blob in blobs] == [1]
+
+    await async_client.delete(
+        f"/api/v1/projects/{second_project_id}/scripts/"
+        f"{script_ids[second_project_id]}",
+        headers=headers,
+    )
+    async with session_maker() as session:
+        assert (await session.execute(select(BlobModel))).scalars().all() == []
+        assert (await session.execute(select(BlobChunkModel))).scalars().all() == []
+
+
+@pytest.mark.asyncio
+async def test_script_conditional_requests(async_client):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user13", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user13", "password": "pass"}
+    )
+    access_token = token_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    project_response = await async_client.post(
+        "/api/v1/projects/", json={"name": "Project Nu"}, headers=headers
+    )
+    project_id = project_response.json()["id"]
+    script_response = await async_client.post(
+        f"/api/v1/projects/{project_id}/scripts",
+        json={"path": "etag.py", "source_code": "print(1)"},
+        headers=headers,
+    )
+    script_url = f"/api/v1/projects/{project_id}/scripts/{script_response.json()['id']}"
+
+    response = await async_client.get(script_url, headers=headers)
+    etag = response.headers["ETag"]
+
+    response = await async_client.get(
+        script_url, headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = await async_client.put(
+        script_url,
+        json={"path": "etag.py", "source_code": "print(2)"},
+        headers={**headers, "If-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    response = await async_client.put(
+        script_url,
+        json={"path": "etag.py", "source_code": "print(3)"},
+        headers={**headers, "If-Match": etag},
+    )
+    assert response.status_code == 412
+
+    response = await async_client.get(
+        script_url, headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["source_code"] == "print(2)"
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_and_export(async_client):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user14", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user14", "password": "pass"}
+    )
+    access_token = token_response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    project_response = await async_client.post(
+        "/api/v1/projects/", json={"name": "Project Xi"}, headers=headers
+    )
+    project_id = project_response.json()["id"]
+    await async_client.post(
+        f"/api/v1/projects/{project_id}/scripts",
+        json={"path": "existing.py", "source_code": "print('old')"},
+        headers=headers,
+    )
+
+    lines = [
+        {"path": "a.py", "source_code": "print('a')"},
+        {"path": "b.py", "source_code": "print('a')"},
+        {"path": "existing.py", "source_code": "print('new')"},
+        {"path": "a.py", "source_code": "print('again')"},
+    ]
+    response = await async_client.post(
+        f"/api/v1/projects/{project_id}/scripts/import",
+        content="\n".join(json.dumps(line) for line in lines),
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["imported"] == 2
+    assert {conflict["path"] for conflict in data["conflicts"]} == {
+        "existing.py",
+        "a.py",
+    }
+
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        content = b"print('c')"
+        info = tarfile.TarInfo("dir/c.py")
+        info.size = len(content)
+        tar.addfile(info, io.BytesIO(content))
+    response = await async_client.post(
+        f"/api/v1/projects/{project_id}/scripts/import",
+        content=archive.getvalue(),
+        headers={**headers, "Content-Type": "application/gzip"},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"imported": 1, "conflicts": []}
+
+    response = await async_client.get(
+        f"/api/v1/projects/{project_id}/scripts/export", headers=headers
+    )
+    assert response.status_code == 200
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert exported == [
+        {"path": "existing.py", "source_code": "print('old')"},
+        {"path": "a.py", "source_code": "print('a')"},
+        {"path": "b.py", "source_code": "print('a')"},
+        {"path": "dir/c.py", "source_code": "print('c')"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_mutations_are_scoped_to_owner(async_client, session_maker):
+    tokens = {}
+    for login in ["user15", "user16"]:
+        await async_client.post(
+            "/api/v1/register", json={"login": login, "password": "pass"}
+        )
+        token_response = await async_client.post(
+            "/api/v1/token", json={"login": login, "password": "pass"}
+        )
+        tokens[login] = token_response.json()["access_token"]
+    owner_headers = {"Authorization": f"Bearer {tokens['user15']}"}
+    other_headers = {"Authorization": f"Bearer {tokens['user16']}"}
+
+    project_response = await async_client.post(
+        "/api/v1/projects/", json={"name": "Project Omicron"}, headers=owner_headers
+    )
+    project_url = f"/api/v1/projects/{project_response.json()['id']}"
+    script_response = await async_client.post(
+        f"{project_url}/scripts",
+        json={"path": "main.py", "source_code": "print('owned')"},
+        headers=owner_headers,
+    )
+    script_url = f"{project_url}/scripts/{script_response.json()['id']}"
+
+    response = await async_client.put(
+        script_url,
+        json={"path": "main.py", "source_code": "print('stolen')"},
+        headers=other_headers,
+    )
+    assert response.status_code == 404
+    response = await async_client.delete(script_url, headers=other_headers)
+    assert response.status_code == 404
+    response = await async_client.put(
+        project_url, json={"name": "Project Stolen"}, headers=other_headers
+    )
+    assert response.status_code == 404
+    response = await async_client.delete(project_url, headers=other_headers)
+    assert response.status_code == 404
+
+    async with session_maker() as session:
+        blobs = (await session.execute(select(BlobModel))).scalars().all()
+    assert [blob.ref_count for blob in blobs] == [1]
+
+    response = await async_client.get(script_url, headers=owner_headers)
+    assert response.json()["source_code"] == "print('owned')"
+
+
+@pytest.mark.asyncio
+async def test_create_script_in_foreign_project(async_client):
+    headers = {}
+    for login in ["user17", "user18"]:
+        await async_client.post(
+            "/api/v1/register", json={"login": login, "password": "pass"}
+        )
+        token_response = await async_client.post(
+            "/api/v1/token", json={"login": login, "password": "pass"}
+        )
+        headers[login] = {
+            "Authorization": f"Bearer {token_response.json()['access_token']}"
+        }
+
+    project_response = await async_client.post(
+        "/api/v1/projects/", json={"name": "Project Pi"}, headers=headers["user17"]
+    )
+    project_id = project_response.json()["id"]
+
+    response = await async_client.post(
+        f"/api/v1/projects/{project_id}/scripts",
+        json={"path": "main.py", "source_code": "print('intruder')"},
+        headers=headers["user18"],
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Project not found"
+
+
+@pytest.mark.asyncio
+async def test_project_ownership_is_cached_until_delete(async_client, session_maker):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user19", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user19", "password": "pass"}
+    )
+    headers = {"Authorization": f"Bearer {token_response.json()['access_token']}"}
+    project_response = await async_client.post(
+        "/api/v1/projects/", json={"name": "Project Rho"}, headers=headers
+    )
+    project_url = f"/api/v1/projects/{project_response.json()['id']}"
+    await async_client.get(f"{project_url}/scripts", headers=headers)
+
+    statements = []
+
+    def listener(_conn, _cursor, statement, *_):
+        statements.append(statement)
+
+    engine = session_maker.kw["bind"].sync_engine
+    event.listen(engine, "before_cursor_execute", listener)
+    response = await async_client.get(f"{project_url}/scripts", headers=headers)
+    event.remove(engine, "before_cursor_execute", listener)
+    assert response.status_code == 200
+    assert not [sql for sql in statements if "projects" in sql]
+
+    await async_client.delete(project_url, headers=headers)
+    response = await async_client.get(f"{project_url}/scripts", headers=headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_writes_to_project_deleted_elsewhere_return_not_found(
+    async_client, session_maker
+):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user20", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user20", "password": "pass"}
+    )
+    headers = {"Authorization": f"Bearer {token_response.json()['access_token']}"}
+    project_urls = []
+    for name in ["Project Sigma", "Project Tau"]:
+        project_response = await async_client.post(
+            "/api/v1/projects/", json={"name": name}, headers=headers
+        )
+        project_urls.append(f"/api/v1/projects/{project_response.json()['id']}")
+        await async_client.get(f"{project_urls[-1]}/scripts", headers=headers)
+
+    # Another worker deletes the projects; this worker's ownership cache is stale.
+    async with session_maker() as session:
+        await session.execute(delete(ProjectModel))
+        await session.commit()
+
+    response = await async_client.post(
+        f"{project_urls[0]}/scripts",
+        json={"path": "main.py", "source_code": "print('hi')"},
+        headers=headers,
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Project not found"
+
+    response = await async_client.post(
+        f"{project_urls[1]}/scripts/import",
+        content=json.dumps({"path": "a.py", "source_code": "print('a')"}) + "\n",
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 404
+
+    response = await async_client.get(f"{project_urls[0]}/scripts", headers=headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_upload_to_missing_script_stores_nothing(async_client, session_maker):
+    await async_client.post(
+        "/api/v1/register", json={"login": "user21", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user21", "password": "pass"}
+    )
+    headers = {"Authorization": f"Bearer {token_response.json()['access_token']}"}
+    project_response = await async_client.post(
+        "/api/v1/projects/", json={"name": "Project Upsilon"}, headers=headers
+    )
+    project_url = f"/api/v1/projects/{project_response.json()['id']}"
+
+    statements = []
+
+    def listener(_conn, _cursor, statement, *_):
+        statements.append(statement)
+
+    engine = session_maker.kw["bind"].sync_engine
+    event.listen(engine, "before_cursor_execute", listener)
+    response = await async_client.put(
+        f"{project_url}/scripts/999/source", content=b"print('hi')\n", headers=headers
+    )
+    assert response.status_code == 404
+    response = await async_client.put(
+        f"{project_url}/scripts/999",
+        json={"path": "main.py", "source_code": "print('hi')"},
+        headers=headers,
+    )
+    assert response.status_code == 404
+    event.remove(engine, "before_cursor_execute", listener)
+    assert not [sql for sql in statements if sql.startswith("INSERT")]
+
+
+@pytest.mark.asyncio
+async def test_archive_import_enforces_decompressed_size_caps(
+    async_client, monkeypatch
+):
+    settings = get_settings().projects
+    monkeypatch.setattr(settings, "import_max_entry_size", 1024)
+    monkeypatch.setattr(settings, "import_max_total_size", 1536)
+    await async_client.post(
+        "/api/v1/register", json={"login": "user22", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user22", "password": "pass"}
+    )
+    headers = {"Authorization": f"Bearer {token_response.json()['access_token']}"}
+    project_response = await async_client.post(
+        "/api/v1/projects/", json={"name": "Project Phi"}, headers=headers
+    )
+    import_url = f"/api/v1/projects/{project_response.json()['id']}/scripts/import"
+
+    # Highly compressible entries, as in a zip bomb.
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("big.py", b"#" * 4096)
+    response = await async_client.post(
+        import_url,
+        content=archive.getvalue(),
+        headers={**headers, "Content-Type": "application/zip"},
+    )
+    assert response.status_code == 413
+    assert "big.py" in response.json()["detail"]
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("a.py", b"#" * 1000)
+        zip_file.writestr("b.py", b"#" * 1000)
+    response = await async_client.post(
+        import_url,
+        content=archive.getvalue(),
+        headers={**headers, "Content-Type": "application/zip"},
+    )
+    assert response.status_code == 413
+    assert "archive" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_ndjson_import_enforces_size_caps(async_client, monkeypatch):
+    settings = get_settings().projects
+    monkeypatch.setattr(settings, "import_max_entry_size", 1024)
+    monkeypatch.setattr(settings, "import_max_total_size", 4096)
+    await async_client.post(
+        "/api/v1/register", json={"login": "user23", "password": "pass"}
+    )
+    token_response = await async_client.post(
+        "/api/v1/token", json={"login": "user23", "password": "pass"}
+    )
+    headers = {"Authorization": f"Bearer {token_response.json()['access_token']}"}
+    project_response = await async_client.post(
+        "/api/v1/projects/", json={"name": "Project Chi"}, headers=headers
+    )
+    headers["Content-Type"] = "application/x-ndjson"
+    import_url = f"/api/v1/projects/{project_response.json()['id']}/scripts/import"
+
+    async def chunks(*parts):
+        for part in parts:
+            yield part
+
+    # A line that never ends is rejected once it outgrows the entry cap.
+    response = await async_client.post(
+        import_url, content=chunks(b'{"path": "a.py", ', b"#" * 2048), headers=headers
+    )
+    assert response.status_code == 413
+    assert "line 1" in response.json()["detail"]
+
+    line = json.dumps({"path": "a.py", "source_code": "#" * 500}).encode() + b"\n"
+    response = await async_client.post(
+        import_url, content=chunks(*[line] * 10), headers=headers
+    )
+    assert response.status_code == 413
+    assert "body" in response.json()["detail"]
+
+    response = await async_client.post(
+        import_url, content=chunks(line[:100], line[100:]), headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json() == {"imported": 1, "conflicts": []}
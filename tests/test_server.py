@@ -0,0 +1,50 @@
+import pytest
+import uvicorn
+
+from config import get_settings
+from src import main
+
+
+def test_run_migrates_once_and_passes_server_settings(monkeypatch, tmp_path):
+    server = get_settings().server
+    monkeypatch.setattr(server, "workers", 4)
+    monkeypatch.setattr(server, "loop", "uvloop")
+    monkeypatch.setattr(server, "forwarded_allow_ips", "10.0.0.0/8")
+    monkeypatch.setattr(get_settings().rate_limit, "rate_limit_backend", "kv")
+    monkeypatch.setattr(get_settings().db, "db_migrate_on_startup", True)
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+
+    migrations = []
+
+    async def fake_migrate_database(settings):
+        migrations.append(settings)
+
+    calls = []
+    monkeypatch.setattr(main, "migrate_database", fake_migrate_database)
+    monkeypatch.setattr(uvicorn, "run", lambda app, **kwargs: calls.append(kwargs))
+
+    main.run()
+
+    assert len(migrations) == 1
+    assert calls[0]["workers"] == 4
+    assert calls[0]["loop"] == "uvloop"
+    assert calls[0]["port"] == server.port
+    assert calls[0]["proxy_headers"] is True
+    assert calls[0]["forwarded_allow_ips"] == "10.0.0.0/8"
+
+
+def test_run_refuses_per_worker_rate_limits(monkeypatch, tmp_path):
+    monkeypatch.setattr(get_settings().server, "workers", 4)
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(get_settings().rate_limit, "rate_limit_backend", "memory")
+    calls = []
+    monkeypatch.setattr(uvicorn, "run", lambda app, **kwargs: calls.append(kwargs))
+
+    with pytest.raises(ValueError, match="RATE_LIMIT_BACKEND=kv"):
+        main.run()
+    assert calls == []
+
+    monkeypatch.setattr(get_settings().rate_limit, "rate_limit_enabled", False)
+    monkeypatch.setattr(get_settings().db, "db_migrate_on_startup", False)
+    main.run()
+    assert calls[0]["workers"] == 4
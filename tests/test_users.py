@@ -1,8 +1,25 @@
 from decimal import Decimal
 
+import jwt
 import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from fastapi import HTTPException
+from sqlalchemy import event, update
 
+import users.dependencies
+from config import get_settings
+from kv import InMemoryKeyValueClient, get_kv_client
+from rate_limit import KeyValueCounterStore, SlidingWindowRateLimiter
+from src.main import app
 from tests.fixtures import async_client
+from users.cache import TokenCache
+from users.dependencies import TokenValidator, get_token_validator
+from users.hashing import PasswordHasher, get_password_hasher
+from users.keys import get_key_ring, load_key_ring
+from users.models import UserModel
+from users.revocation import KeyValueTokenVersionStore
+from users.verifier import JwksVerifier
 
 
 @pytest.mark.asyncio
@@ -120,3 +137,442 @@ async def test_add_money(async_client):
     assert response.status_code == 200
     data = response.json()
     assert Decimal(data["money_balance"]) == Decimal("100.5")
+    assert set(data) == {"id", "login", "money_balance"}
+
+
+@pytest.mark.asyncio
+async def test_money_balance_wire_format(async_client):
+    register_response = await async_client.post(
+        "/api/v1/register", json={"login": "testuser", "password": "testpass"}
+    )
+    assert b'"money_balance":0.0}' in register_response.content
+    user_id = register_response.json()["id"]
+    login_response = await async_client.post(
+        "/api/v1/token", json={"login": "testuser", "password": "testpass"}
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    await async_client.post(
+        f"/api/v1/users/{user_id}/add_money",
+        json={"amount": "0.1234567891"},
+        headers=headers,
+    )
+    response = await async_client.get("/api/v1/users/me", headers=headers)
+    assert b'"money_balance":0.1234567891}' in response.content
+
+    await async_client.post(
+        f"/api/v1/users/{user_id}/add_money",
+        json={"amount": "99.8765432109"},
+        headers=headers,
+    )
+    response = await async_client.get("/api/v1/users/me", headers=headers)
+    assert b'"money_balance":100.0}' in response.content
+
+
+@pytest.mark.asyncio
+async def test_revoke_tokens_invalidates_cached_token(async_client):
+    register_response = await async_client.post(
+        "/api/v1/register", json={"login": "testuser", "password": "testpass"}
+    )
+    user_id = register_response.json()["id"]
+    login_response = await async_client.post(
+        "/api/v1/token", json={"login": "testuser", "password": "testpass"}
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    response = await async_client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == 200
+
+    response = await async_client.post(
+        f"/api/v1/users/{user_id}/revoke_tokens", headers=headers
+    )
+    assert response.status_code == 200
+
+    response = await async_client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token revoked"
+
+
+@pytest.mark.asyncio
+async def test_register_when_hashing_pool_is_saturated(async_client):
+    saturated_hasher = PasswordHasher(max_workers=1, max_pending=0)
+    app.dependency_overrides[get_password_hasher] = lambda: saturated_hasher
+
+    response = await async_client.post(
+        "/api/v1/register", json={"login": "testuser", "password": "testpass"}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    saturated_hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cached_token_rejected_after_revocation_on_another_node(
+    async_client, monkeypatch
+):
+    token_version_store = KeyValueTokenVersionStore(InMemoryKeyValueClient())
+    monkeypatch.setattr(
+        users.dependencies, "get_token_version_store", lambda: token_version_store
+    )
+    get_token_validator.cache_clear()
+
+    register_response = await async_client.post(
+        "/api/v1/register", json={"login": "testuser", "password": "testpass"}
+    )
+    user_id = register_response.json()["id"]
+    login_response = await async_client.post(
+        "/api/v1/token", json={"login": "testuser", "password": "testpass"}
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    response = await async_client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == 200
+
+    await token_version_store.set_version(user_id, 1)
+
+    response = await async_client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token revoked"
+    get_token_validator.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_cache_miss_reads_token_version_from_kv(
+    async_client, session_maker, monkeypatch
+):
+    token_version_store = KeyValueTokenVersionStore(InMemoryKeyValueClient())
+    monkeypatch.setattr(
+        users.dependencies, "get_token_version_store", lambda: token_version_store
+    )
+    get_token_validator.cache_clear()
+
+    register_response = await async_client.post(
+        "/api/v1/register", json={"login": "testuser", "password": "testpass"}
+    )
+    user_id = register_response.json()["id"]
+    login_response = await async_client.post(
+        "/api/v1/token", json={"login": "testuser", "password": "testpass"}
+    )
+    tokens = login_response.json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    response = await async_client.get("/api/v1/users/me", headers=headers)
+    assert response.status_code == 200
+    assert await token_version_store.get_version(user_id) == 0
+
+    statements = []
+    engine = session_maker.kw["bind"].sync_engine
+
+    def listener(_conn, _cursor, statement, *_):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", listener)
+    response = await async_client.post(
+        "/api/v1/token/verify", json={"token": tokens["refresh_token"]}
+    )
+    event.remove(engine, "before_cursor_execute", listener)
+    assert response.status_code == 200
+    assert not [sql for sql in statements if "FROM users" in sql]
+
+    await token_version_store.set_version(user_id, 1)
+    response = await async_client.post(
+        "/api/v1/token/verify", json={"token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 401
+    get_token_validator.cache_clear()
+
+
+def test_kv_backend_requires_kv_url(monkeypatch):
+    monkeypatch.setattr(get_settings().kv, "kv_url", None)
+    get_kv_client.cache_clear()
+    with pytest.raises(ValueError):
+        get_kv_client()
+    get_kv_client.cache_clear()
+
+
+async def revoke_in_db(session_maker, user_id):
+    async with session_maker() as session:
+        await session.execute(
+            update(UserModel)
+            .values(token_version=UserModel.token_version + 1)
+            .where(UserModel.id == user_id)
+        )
+        await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_revocation_reaches_other_workers(
+    async_client, session_maker, monkeypatch
+):
+    register_response = await async_client.post(
+        "/api/v1/register", json={"login": "testuser", "password": "testpass"}
+    )
+    user_id = register_response.json()["id"]
+    login_response = await async_client.post(
+        "/api/v1/token", json={"login": "testuser", "password": "testpass"}
+    )
+    token = login_response.json()["access_token"]
+    settings = get_settings()
+
+    # Two workers with their own token caches and a shared kv version store.
+    store = KeyValueTokenVersionStore(InMemoryKeyValueClient())
+    workers = [TokenValidator(None, TokenCache(100, 30), store) for _ in range(2)]
+    async with session_maker() as session:
+        for worker in workers:
+            await worker(token, session, settings)
+        await revoke_in_db(session_maker, user_id)
+        await store.set_version(user_id, 1)
+        workers[0].token_cache.invalidate_user(user_id)
+        for worker in workers:
+            with pytest.raises(HTTPException) as exc_info:
+                await worker(token, session, settings)
+            assert exc_info.value.detail == "Token revoked"
+
+    # Without kv, several workers run with the token cache off.
+    monkeypatch.setattr(settings.server, "workers", 2)
+    get_token_validator.cache_clear()
+    assert get_token_validator().token_cache is None
+    login_response = await async_client.post(
+        "/api/v1/token", json={"login": "testuser", "password": "testpass"}
+    )
+    token = login_response.json()["access_token"]
+    workers = [get_token_validator(), TokenValidator(None, None, None)]
+    async with session_maker() as session:
+        for worker in workers:
+            await worker(token, session, settings)
+        await revoke_in_db(session_maker, user_id)
+        for worker in workers:
+            with pytest.raises(HTTPException) as exc_info:
+                await worker(token, session, settings)
+            assert exc_info.value.detail == "Token revoked"
+    get_token_validator.cache_clear()
+
+
+def write_signing_key(directory, kid, key):
+    (directory / f"{kid}.pem").write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+
+
+@pytest.fixture
+def signing_keys(tmp_path, monkeypatch):
+    rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    ed25519_key = ed25519.Ed25519PrivateKey.generate()
+    for kid, key in [("2026-01", rsa_key), ("2026-02", ed25519_key)]:
+        write_signing_key(tmp_path, kid, key)
+    monkeypatch.setattr(get_settings().auth_jwt, "keys_dir", str(tmp_path))
+    get_key_ring.cache_clear()
+    yield
+    get_key_ring.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_asymmetric_tokens_and_jwks(async_client, signing_keys):
+    register_response = await async_client.post(
+        "/api/v1/register", json={"login": "testuser", "password": "testpass"}
+    )
+    login_response = await async_client.post(
+        "/api/v1/token", json={"login": "testuser", "password": "testpass"}
+    )
+    access_token = login_response.json()["access_token"]
+    assert jwt.get_unverified_header(access_token)["kid"] == "2026-02"
+
+    response = await async_client.get(
+        "/api/v1/users/me", headers={"Authorization": f"Bearer {access_token}"}
+    )
+    assert response.status_code == 200
+
+    response = await async_client.get("/api/v1/.well-known/jwks.json")
+    assert response.status_code == 200
+    assert "max-age" in response.headers["Cache-Control"]
+    jwks = response.json()
+    assert [(key["kid"], key["alg"]) for key in jwks["keys"]] == [
+        ("2026-01", "RS256"),
+        ("2026-02", "EdDSA"),
+    ]
+
+    response = await async_client.get(
+        "/api/v1/.well-known/jwks.json",
+        headers={"If-None-Match": response.headers["ETag"]},
+    )
+    assert response.status_code == 304
+
+    verifier = JwksVerifier("http://users.internal/api/v1/.well-known/jwks.json")
+    verifier.client.fetch_data = lambda: jwks
+    payload = verifier.verify(access_token)
+    assert payload.id == register_response.json()["id"]
+    with pytest.raises(jwt.InvalidTokenError):
+        verifier.verify(login_response.json()["refresh_token"])
+
+
+def test_key_ring_validates_keys(tmp_path):
+    write_signing_key(tmp_path, "2026-01", ec.generate_private_key(ec.SECP256R1()))
+    write_signing_key(tmp_path, "2026-02", ec.generate_private_key(ec.SECP384R1()))
+    auth_jwt = get_settings().auth_jwt.model_copy(
+        update={"keys_dir": str(tmp_path), "active_kid": "2026-03"}
+    )
+    with pytest.raises(ValueError, match="2026-01, 2026-02"):
+        load_key_ring(auth_jwt)
+
+    key_ring = load_key_ring(auth_jwt.model_copy(update={"active_kid": None}))
+    assert [key.algorithm for key in key_ring.keys.values()] == ["ES256", "ES384"]
+    signing_key = key_ring.signing_key
+    token = jwt.encode({"sub": "1"}, signing_key.private_key, signing_key.algorithm)
+    jwk = jwt.PyJWK(signing_key.to_jwk())
+    assert jwk.algorithm_name == "ES384"
+    assert jwt.decode(token, jwk.key, algorithms=["ES384"]) == {"sub": "1"}
+
+    write_signing_key(tmp_path, "2026-03", ec.generate_private_key(ec.SECP256K1()))
+    with pytest.raises(ValueError, match="secp256k1"):
+        load_key_ring(auth_jwt)
+
+
+@pytest.mark.asyncio
+async def test_verify_tokens_batch(async_client, session_maker):
+    tokens = {}
+    for login in ["alice", "bob"]:
+        await async_client.post(
+            "/api/v1/register", json={"login": login, "password": "testpass"}
+        )
+        login_response = await async_client.post(
+            "/api/v1/token", json={"login": login, "password": "testpass"}
+        )
+        tokens[login] = login_response.json()
+
+    statements = []
+    engine = session_maker.kw["bind"].sync_engine
+
+    def listener(_conn, _cursor, statement, *_):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", listener)
+    response = await async_client.post(
+        "/api/v1/token/verify/batch",
+        json={
+            "tokens": [
+                tokens["alice"]["access_token"],
+                tokens["bob"]["refresh_token"],
+                "not-a-token",
+                tokens["alice"]["access_token"],
+            ]
+        },
+    )
+    event.remove(engine, "before_cursor_execute", listener)
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["valid"] for result in results] == [True, True, False, True]
+    assert results[1]["token_type"] == "refresh"
+    assert results[2]["detail"] == "Invalid token"
+    assert results[0]["user_id"] != results[1]["user_id"]
+    assert len([sql for sql in statements if "FROM users" in sql]) == 1
+
+
+class CountingKeyValueClient(InMemoryKeyValueClient):
+    def __init__(self):
+        super().__init__()
+        self.round_trips = 0
+
+    async def get(self, key):
+        self.round_trips += 1
+        return await super().get(key)
+
+    async def mget(self, keys):
+        self.round_trips += 1
+        return [await InMemoryKeyValueClient.get(self, key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        self.round_trips += 1
+        return super().pipeline(transaction)
+
+
+@pytest.mark.asyncio
+async def test_verify_batch_uses_one_version_store_round_trip_each_way(
+    async_client, session_maker
+):
+    tokens = []
+    for login in ["alice", "bob", "carol"]:
+        await async_client.post(
+            "/api/v1/register", json={"login": login, "password": "testpass"}
+        )
+        login_response = await async_client.post(
+            "/api/v1/token", json={"login": login, "password": "testpass"}
+        )
+        tokens += [
+            login_response.json()["access_token"],
+            login_response.json()["refresh_token"],
+        ]
+
+    client = CountingKeyValueClient()
+    validator = TokenValidator(
+        None, TokenCache(100, 30), KeyValueTokenVersionStore(client)
+    )
+    async with session_maker() as session:
+        results = await validator.resolve_many(tokens, session, get_settings())
+        assert all(isinstance(result, tuple) for result in results)
+        # One MGET for the versions, one pipelined SET NX to seed them.
+        assert client.round_trips == 2
+
+        client.round_trips = 0
+        results = await validator.resolve_many(tokens, session, get_settings())
+        assert all(isinstance(result, tuple) for result in results)
+        assert client.round_trips == 1
+
+
+class CountingHasher(PasswordHasher):
+    def __init__(self):
+        super().__init__(max_workers=1, max_pending=8)
+        self.verify_calls = 0
+
+    async def verify(self, password, hashed_password):
+        self.verify_calls += 1
+        return await super().verify(password, hashed_password)
+
+
+@pytest.mark.asyncio
+async def test_login_is_throttled_before_bcrypt(async_client, monkeypatch):
+    monkeypatch.setattr(get_settings().rate_limit, "login_user_limit", 2)
+    await async_client.post(
+        "/api/v1/register", json={"login": "testuser", "password": "testpass"}
+    )
+    hasher = CountingHasher()
+    app.dependency_overrides[get_password_hasher] = lambda: hasher
+
+    statuses = []
+    for _ in range(3):
+        response = await async_client.post(
+            "/api/v1/token", json={"login": "testuser", "password": "wrongpass"}
+        )
+        statuses.append(response.status_code)
+
+    assert statuses == [401, 401, 429]
+    assert int(response.headers["Retry-After"]) >= 1
+    assert hasher.verify_calls == 2
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_counters_are_shared_through_kv():
+    client = InMemoryKeyValueClient()
+    first_node = SlidingWindowRateLimiter(KeyValueCounterStore(client, ttl=120), 60)
+    second_node = SlidingWindowRateLimiter(KeyValueCounterStore(client, ttl=120), 60)
+
+    await first_node.hit("register:ip:10.0.0.1", 2)
+    await second_node.hit("register:ip:10.0.0.1", 2)
+    with pytest.raises(HTTPException) as exc_info:
+        await first_node.hit("register:ip:10.0.0.1", 2)
+    assert exc_info.value.status_code == 429
+    await second_node.hit("register:ip:10.0.0.2", 2)
+
+
+@pytest.mark.asyncio
+async def test_kv_rate_limit_counter_is_created_with_expiry():
+    client = InMemoryKeyValueClient()
+    store = KeyValueCounterStore(client, ttl=120)
+
+    assert await store.incr("login:ip:10.0.0.1:1") == 1
+    assert await store.incr("login:ip:10.0.0.1:1") == 2
+    assert "rate_limit:login:ip:10.0.0.1:1" in client._expires_at